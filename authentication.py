@@ -1,33 +1,120 @@
+import contextvars
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
 from models.user import User
 
+# Idle time (seconds) after which a session expires; every use extends it
+SESSION_TTL = int(os.environ.get("STOCK_MASTER_SESSION_TTL", 8 * 60 * 60))
+
+# Session of whoever is being served in this context (thread / asyncio task)
+_current_session = contextvars.ContextVar("current_session", default=None)
+
+class Session:
+    """A logged-in user plus an opaque token that identifies them to the server."""
+
+    def __init__(self, user, ttl=SESSION_TTL):
+        self.token = secrets.token_urlsafe(32)
+        self.user = user
+        self.ttl = ttl
+        self.expires_at = time.time() + ttl
+
+    def is_expired(self):
+        return time.time() >= self.expires_at
+
+    def touch(self):
+        """Extend the session by another TTL from now."""
+        self.expires_at = time.time() + self.ttl
+
+
 class Auth:
-    current_user = None  # Track logged-in user
+    _sessions = {}  # token -> Session, for sessions looked up by token
+    _sessions_lock = threading.Lock()
+
+    @staticmethod
+    def create_session(username, password):
+        """Validate credentials and return a new registered Session (None if they are wrong)."""
+        user = User.authenticate(username, password)
+        if not user:
+            return None
+        session = Session(user)
+        with Auth._sessions_lock:
+            # Drop expired sessions while we hold the lock anyway
+            for token in [token for token, old in Auth._sessions.items() if old.is_expired()]:
+                del Auth._sessions[token]
+            Auth._sessions[session.token] = session
+        return session
+
+    @staticmethod
+    def get_session(token):
+        """Return the live session for a token (extending it), or None if unknown or expired."""
+        with Auth._sessions_lock:
+            session = Auth._sessions.get(token)
+            if session is None:
+                return None
+            if session.is_expired():
+                del Auth._sessions[token]
+                return None
+            session.touch()
+            return session
+
+    @staticmethod
+    def end_session(token):
+        """Forget a session so its token stops working."""
+        with Auth._sessions_lock:
+            Auth._sessions.pop(token, None)
+
+    @staticmethod
+    @contextmanager
+    def use_session(session):
+        """Make session the current one for the code inside the with block (this context only)."""
+        reset_token = _current_session.set(session)
+        try:
+            yield session
+        finally:
+            _current_session.reset(reset_token)
+
+    @staticmethod
+    def current_session():
+        """Return the session active in this context, or None."""
+        return _current_session.get()
 
     @staticmethod
     def login(username, password):
         """Log in a user by validating credentials."""
-        user = User.authenticate(username, password)
-        if user:
-            Auth.current_user = user  # Store logged-in user
+        session = Auth.create_session(username, password)
+        if session:
+            _current_session.set(session)  # Store logged-in user for this context
             return True
         return False
 
     @staticmethod
     def logout():
         """Log out the current user."""
-        Auth.current_user = None
+        session = _current_session.get()
+        if session is not None:
+            Auth.end_session(session.token)
+        _current_session.set(None)
 
     @staticmethod
     def get_logged_in_user():
         """Return the currently logged-in user (if any)."""
-        return Auth.current_user
+        session = _current_session.get()
+        if session is None or session.is_expired():
+            return None
+        session.touch()
+        return session.user
 
     @staticmethod
     def is_admin():
         """Check if the logged-in user is an admin."""
-        return Auth.current_user and Auth.current_user.role == "admin"
+        user = Auth.get_logged_in_user()
+        return user and user.role == "admin"
 
     @staticmethod
     def is_employee():
         """Check if the logged-in user is an employee."""
-        return Auth.current_user and Auth.current_user.role == "employee"
+        user = Auth.get_logged_in_user()
+        return user and user.role == "employee"
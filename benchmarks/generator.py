@@ -0,0 +1,80 @@
+import random
+from itertools import accumulate
+from datetime import datetime, timedelta
+from models.user import User
+from storage.backend import create_backend
+
+CATEGORIES = ["Electronics", "Grocery", "Clothing", "Home", "Toys", "Sports", "Books", "Beauty", "Garden", "Office"]
+WORDS = ["Classic", "Smart", "Mini", "Pro", "Eco", "Ultra", "Basic", "Deluxe", "Travel", "Family",
+         "Lamp", "Mouse", "Kettle", "Shirt", "Ball", "Novel", "Cream", "Hose", "Stapler", "Blender"]
+MAX_ITEMS_PER_SALE = 5
+
+def generate_products(count, seed=0):
+    """Return a deterministic catalog {product_id: dict} with count products (P100, P101, ...)."""
+    rng = random.Random(seed)
+    products = {}
+    for i in range(count):
+        product_id = f"P{100 + i}"
+        category = rng.choice(CATEGORIES)
+        name = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}"
+        products[product_id] = {
+            "product_id": product_id,
+            "name": name,
+            "price": rng.randint(1, 5000),
+            "quantity": rng.randint(0, 500),
+            "category": category,
+            "img": f"images/{product_id}.png",
+            "description": f"{name} for {category.lower()}"
+        }
+    return products
+
+def generate_transactions(line_items, product_ids, days=365, seed=0, end=None):
+    """
+    Yield deterministic transaction dicts, oldest first, totalling line_items line items.
+
+    Sales are spread evenly over the last 'days' days before end (default: now)
+    and pick products with a skewed distribution so some SKUs clearly sell best.
+    """
+    rng = random.Random(seed)
+    end = end or datetime.now().replace(microsecond=0)
+    start = end - timedelta(days=days)
+    step = (end - start) / max(1, line_items)
+    # Zipf-like popularity; cumulative weights so each pick is a bisect, not a pass over the catalog
+    cum_weights = list(accumulate(1 / (rank + 1) for rank in range(len(product_ids))))
+
+    emitted = 0
+    sequence = 0
+    while emitted < line_items:
+        size = min(rng.randint(1, MAX_ITEMS_PER_SALE), line_items - emitted)
+        items = rng.choices(product_ids, cum_weights=cum_weights, k=size)
+        customer = rng.randint(1, 5000)
+        date = start + step * emitted
+        yield {
+            "transaction_id": f"BENCH{sequence:09d}",
+            "customer_name": f"Customer {customer}",
+            "customer_phone": f"9{customer:09d}",
+            "product_ids": items,
+            "quantities": [rng.randint(1, 5) for _ in items],
+            "prices": [rng.randint(1, 5000) for _ in items],
+            "date": date.strftime("%Y-%m-%d %H:%M:%S")
+        }
+        emitted += size
+        sequence += 1
+
+def generate_users(count, password="bench", seed=0):
+    """Return {username: record}; every user shares one hash so generating thousands stays fast."""
+    rng = random.Random(seed)
+    hashed = User.hash_password(password)
+    users = {"bench_admin": {"password": hashed, "role": "admin"}}
+    for i in range(count):
+        users[f"user{i}"] = {"password": hashed, "role": "admin" if rng.random() < 0.05 else "employee"}
+    return users
+
+def populate(data_dir, backend_name="json", products=1000, line_items=10000, users=10, days=365, seed=0):
+    """Fill an (empty) data directory with a synthetic dataset and return its backend."""
+    backend = create_backend(backend_name, data_dir)
+    catalog = generate_products(products, seed)
+    backend.save_products(catalog)
+    backend.save_transactions(generate_transactions(line_items, list(catalog), days, seed))
+    backend.save_users(generate_users(users, seed=seed))
+    return backend
@@ -0,0 +1,179 @@
+import argparse
+import itertools
+import json
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from authentication import Auth, Session
+from benchmarks.generator import populate
+from models.product import Product
+from models.sales_aggregates import SalesAggregates
+from models.search_index import KeywordIndex
+from models.user import User
+from services import analytics
+from services.reports import get_best_selling_products, get_total_revenue, get_sales_history_page, get_sales_analysis
+from services.sales import sell_products
+from services.stock_management import check_stock_levels
+from storage.backend import get_backend, set_backend
+
+def _reset_caches():
+    """Forget everything cached in this process so the next call starts cold."""
+    Product.invalidate_cache()
+    User.invalidate_cache()
+    SalesAggregates._state = None
+
+def _load_cold():
+    _reset_caches()
+    return Product.load_products()
+
+BULK_USERS = 8  # Accounts created (and bcrypt-hashed) per add_users run
+_new_user_ids = itertools.count()
+
+def _login(username="user0", password="bench", cold=True):
+    # cold: forget verified credentials first, so the password goes through bcrypt again
+    if cold:
+        User._verified.clear()
+    session = Auth.create_session(username, password)
+    Auth.end_session(session.token)
+
+def _add_users():
+    accounts = [(f"bench_new{next(_new_user_ids)}", "bench", "employee") for _ in range(BULK_USERS)]
+    return User.add_users(accounts)
+
+def _sell_one():
+    product_id = next(pid for pid, product in Product.load_products().items() if product.quantity > 0)
+    return sell_products([(product_id, 1)], "Bench Customer", "9000000000")
+
+# name -> zero-argument callable; each one is timed separately
+CASES = {
+    "load_products_cold": _load_cold,
+    "load_products_warm": Product.load_products,
+    "search_by_id": lambda: Product.search_by_id("P150"),
+    "keyword_index_build": lambda: KeywordIndex.build(Product.load_products()),  # Paid after every catalog reload
+    "search_keyword": lambda: Product.search_products(keyword="smart"),
+    "search_price_range": lambda: Product.search_products(price_range=(100, 200)),
+    "search_combined": lambda: Product.search_products(keyword="lamp", quantity_range=(None, 50)),
+    "check_stock_levels": lambda: check_stock_levels(5),
+    "sell_products": _sell_one,
+    "login": _login,
+    "login_verified": lambda: _login(cold=False),  # Served from the verified-credentials cache
+    "add_users": _add_users,
+    "best_sellers_all": get_best_selling_products,
+    "best_sellers_top10": lambda: get_best_selling_products(limit=10),
+    "best_sellers_7d": lambda: get_best_selling_products(7),
+    "total_revenue": get_total_revenue,
+    "total_revenue_30d": lambda: get_total_revenue(30),
+    "sales_history_page": lambda: get_sales_history_page(page_size=50),
+    "sales_analysis_top10": lambda: get_sales_analysis(limit=10),
+}
+
+def time_case(function, repeat):
+    """Run function repeat times and return timing statistics in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return {
+        "runs": repeat,
+        "min_s": min(timings),
+        "median_s": statistics.median(timings),
+        "mean_s": statistics.fmean(timings),
+        "max_s": max(timings)
+    }
+
+def run(backend_name="json", products=1000, line_items=10000, users=10, days=365, seed=0, repeat=5, cases=None, data_dir=None):
+    """
+    Build a synthetic dataset in a temp data directory and time every case against it.
+
+    Returns a JSON-serialisable dict: {"meta": {...}, "setup_s": ..., "results": {case: stats}}.
+    """
+    selected = cases or list(CASES)
+    unknown = [name for name in selected if name not in CASES]
+    if unknown:
+        raise ValueError(f"Unknown benchmark case(s): {', '.join(unknown)}")
+
+    temp_dir = data_dir or tempfile.mkdtemp(prefix="stock_master_bench_")
+    previous_backend = get_backend()
+    try:
+        start = time.perf_counter()
+        set_backend(populate(temp_dir, backend_name, products, line_items, users, days, seed))
+        setup_time = time.perf_counter() - start
+        _reset_caches()
+
+        results = {}
+        with Auth.use_session(Session(User("bench_admin", None, "admin"))):
+            SalesAggregates.refresh()  # Initial build is part of setup, not of the first report
+            for name in selected:
+                results[name] = time_case(CASES[name], repeat)
+    finally:
+        set_backend(previous_backend)
+        _reset_caches()
+        if data_dir is None:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": analytics.is_available(),
+            "backend": backend_name,
+            "products": products,
+            "line_items": line_items,
+            "users": users,
+            "days": days,
+            "seed": seed,
+            "repeat": repeat
+        },
+        "setup_s": setup_time,
+        "results": results
+    }
+
+def compare(report, baseline, tolerance=1.2):
+    """Return [(case, baseline_median, median)] for cases more than 'tolerance' times slower than baseline."""
+    regressions = []
+    for name, stats in report["results"].items():
+        before = baseline["results"].get(name)
+        if before and stats["median_s"] > before["median_s"] * tolerance:
+            regressions.append((name, before["median_s"], stats["median_s"]))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time Stock Master operations on a synthetic dataset")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--products", type=int, default=1000, help="Catalog size (SKUs)")
+    parser.add_argument("--line-items", type=int, default=10000, help="Transaction line items in the history")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--days", type=int, default=365, help="Days of history the sales are spread over")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per case")
+    parser.add_argument("--case", action="append", dest="cases", help="Run only this case (repeatable)")
+    parser.add_argument("--output", help="Write the JSON results to this file (default: stdout)")
+    parser.add_argument("--baseline", help="Earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.2, help="Slowdown factor that counts as a regression")
+    args = parser.parse_args(argv)
+
+    report = run(args.backend, args.products, args.line_items, args.users, args.days, args.seed, args.repeat, args.cases)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            regressions = compare(report, json.load(file), args.tolerance)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: median {before * 1000:.2f} ms -> {after * 1000:.2f} ms", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
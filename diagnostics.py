@@ -0,0 +1,159 @@
+import atexit
+import contextvars
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+# STOCK_MASTER_DIAGNOSTICS=1 turns instrumentation on. It is read once at import:
+# when off, @instrument returns the function untouched and add() returns at once.
+ENABLED = os.environ.get("STOCK_MASTER_DIAGNOSTICS", "").lower() not in ("", "0", "off", "false")
+
+# Comma-separated operation names (or "all") to capture with cProfile, one .prof file per call
+PROFILE = {name.strip() for name in os.environ.get("STOCK_MASTER_PROFILE", "").split(",") if name.strip()}
+
+# Where dump() writes; profiles go to a "profiles" folder next to it
+STATS_FILE = os.environ.get(
+    "STOCK_MASTER_DIAGNOSTICS_FILE",
+    os.path.join(os.environ.get("STOCK_MASTER_DATA_DIR", "database"), "diagnostics.json")
+)
+
+# Upper bounds (milliseconds) of the latency histogram buckets; slower calls go in the last one
+BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000)
+COUNTERS = ("bytes_read", "bytes_written", "json_parses")
+
+_lock = threading.Lock()
+_operations = {}  # name -> stats dict
+_totals = dict.fromkeys(COUNTERS, 0)
+_started = datetime.now().isoformat(timespec="seconds")
+
+# Counters of the outermost instrumented call running in this context (the "request")
+_request = contextvars.ContextVar("diagnostics_request", default=None)
+_profiling = contextvars.ContextVar("diagnostics_profiling", default=False)
+
+def _new_stats():
+    stats = {"calls": 0, "errors": 0, "total_s": 0.0, "max_s": 0.0, "histogram_ms": [0] * (len(BUCKETS_MS) + 1)}
+    stats.update(dict.fromkeys(COUNTERS, 0))
+    return stats
+
+def _bucket(elapsed):
+    elapsed_ms = elapsed * 1000
+    for index, bound in enumerate(BUCKETS_MS):
+        if elapsed_ms < bound:
+            return index
+    return len(BUCKETS_MS)
+
+def add(counter, amount=1):
+    """Count bytes read/written or JSON parses, for the process and the current request."""
+    if not ENABLED:
+        return
+    request = _request.get()
+    with _lock:
+        _totals[counter] += amount
+    if request is not None:
+        request[counter] += amount
+
+def _record(name, elapsed, failed, request):
+    with _lock:
+        stats = _operations.get(name)
+        if stats is None:
+            stats = _operations[name] = _new_stats()
+        stats["calls"] += 1
+        stats["errors"] += failed
+        stats["total_s"] += elapsed
+        stats["max_s"] = max(stats["max_s"], elapsed)
+        stats["histogram_ms"][_bucket(elapsed)] += 1
+        if request is not None:
+            for counter in COUNTERS:
+                stats[counter] += request[counter]
+
+def _profile_path(name):
+    directory = os.path.join(os.path.dirname(STATS_FILE) or ".", "profiles")
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{name}-{datetime.now():%Y%m%d-%H%M%S-%f}.prof")
+
+def instrument(name):
+    """
+    Decorator: record call count, latency histogram and I/O counters under name.
+
+    I/O counters are charged to the outermost instrumented call, so a service
+    function's entry shows everything one request read, wrote and parsed.
+    """
+    def decorate(function):
+        if not ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            outermost = _request.get() is None
+            request_token = _request.set(dict.fromkeys(COUNTERS, 0)) if outermost else None
+            profile = (name in PROFILE or "all" in PROFILE) and not _profiling.get()
+            failed = False
+            start = time.perf_counter()
+            try:
+                if profile:
+                    profiling_token = _profiling.set(True)
+                    profiler = cProfile.Profile()
+                    try:
+                        return profiler.runcall(function, *args, **kwargs)
+                    finally:
+                        _profiling.reset(profiling_token)
+                        profiler.dump_stats(_profile_path(name))
+                return function(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                _record(name, elapsed, failed, _request.get() if outermost else None)
+                if outermost:
+                    _request.reset(request_token)
+        return wrapper
+    return decorate
+
+def snapshot():
+    """Return the collected statistics as a JSON-serialisable dict."""
+    labels = [f"<{bound}ms" for bound in BUCKETS_MS] + [f">={BUCKETS_MS[-1]}ms"]
+    with _lock:
+        operations = {}
+        for name, stats in sorted(_operations.items()):
+            entry = dict(stats)
+            entry["mean_s"] = stats["total_s"] / stats["calls"] if stats["calls"] else 0.0
+            entry["histogram_ms"] = dict(zip(labels, stats["histogram_ms"]))
+            operations[name] = entry
+        return {
+            "enabled": ENABLED,
+            "started": _started,
+            "captured": datetime.now().isoformat(timespec="seconds"),
+            "totals": dict(_totals),
+            "operations": operations
+        }
+
+def reset():
+    """Clear all collected statistics."""
+    with _lock:
+        _operations.clear()
+        for counter in COUNTERS:
+            _totals[counter] = 0
+
+def dump(path=None):
+    """Write snapshot() to path (default STATS_FILE) and return the path."""
+    path = path or STATS_FILE
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump(snapshot(), file, indent=2)
+    os.replace(temp_path, path)
+    return path
+
+def _dump_on_exit():
+    if _operations:
+        try:
+            dump()
+        except OSError:
+            pass
+
+if ENABLED:
+    atexit.register(_dump_on_exit)
@@ -1,9 +1,14 @@
+import argparse
+from datetime import datetime
+import diagnostics
 from authentication import Auth
 from models.product import Product
 from models.user import User 
-from services.reports import get_best_selling_products, get_total_revenue, get_sales_history
-from services.sales import sell_products
-from services.stock_management import check_stock_levels, refill_stock
+from services.reports import get_best_selling_products, get_total_revenue, get_sales_history_page, rebuild_sales_aggregates, get_sales_analysis, get_sales_trend, get_period_report
+from services.sales import sell_products, sell_orders_file
+from services.catalog_io import import_catalog, export_catalog
+from services.user_management import import_users, rehash_passwords
+from services.stock_management import check_stock_levels, get_stock_alerts, refill_stock, set_reorder_threshold
 from models.product import Product
 
 # Helper function to get optional input (returns None if empty)
@@ -138,14 +143,12 @@ def product_tab():
 
         elif choice == "6":
             # Check Stock Levels
-            threshold = get_optional_input("👉 Enter stock threshold: ", int)
-            if threshold is None:
-                threshold = 5
+            threshold = get_optional_input("👉 Enter stock threshold (blank = each product's reorder level): ", int)
             low_stock = check_stock_levels(threshold)
             if low_stock:
                 print("⚠️ Low Stock Alert:")
                 for item in low_stock:
-                    print(f"🔹 {item['product_id']}: {item['name']}, Qty: {item['quantity']}")
+                    print(f"🔹 {item['product_id']}: {item['name']}, Qty: {item['quantity']} (threshold {item['threshold']})")
             else:
                 print("✅ Stock levels are sufficient.")
 
@@ -161,7 +164,8 @@ def user_tab():
         print("\n👤 User Management")
         print("1️⃣ Load Users")
         print("2️⃣ Add User")
-        print("3️⃣ 🔙 Back to Admin Panel")
+        print("3️⃣ Import Users from File")
+        print("4️⃣ 🔙 Back to Admin Panel")
 
         choice = input("👉 Choose an option: ")
 
@@ -188,6 +192,16 @@ def user_tab():
                 print("✅ User added successfully!" if success else "❌ Username already exists!")
 
             case "3":
+                path = input("👉 Enter file path (.csv or .jsonl with username, password, role): ").strip()
+                result = import_users(path)
+                if "error" in result:
+                    print(f"❌ {result['error']}")
+                    continue
+                for item in result["errors"]:
+                    print(f"   ⚠️ {item['username'] or '(blank)'}: {item['error']}")
+                print(f"✅ {result['message']}")
+
+            case "4":
                 print("🔙 Returning to Admin Panel...")
                 return
 
@@ -200,7 +214,11 @@ def reports_tab():
         print("1️⃣ View Best-Selling Products")
         print("2️⃣ View Total Revenue")
         print("3️⃣ View Sales History")
-        print("4️⃣ 🔙 Back to Admin Panel")
+        print("4️⃣ Rebuild Sales Aggregates")
+        print("5️⃣ Sales Analysis (custom date range)")
+        print("6️⃣ Sales Trend (daily/weekly)")
+        print("7️⃣ Period Report (calendar range)")
+        print("8️⃣ 🔙 Back to Admin Panel")
 
         choice = input("👉 Choose an option: ")
 
@@ -208,16 +226,20 @@ def reports_tab():
             case "1":
                 days = input("📅 Enter number of days (or press Enter for all time): ")
                 days = int(days) if days.strip().isdigit() else None
-                result = get_best_selling_products(days)
+                limit = get_optional_input("🏆 Show top how many? (or press Enter for all): ", int)
+                rank_by = "revenue" if input("📈 Rank by (1) units or (2) revenue? [1]: ").strip() == "2" else "units"
+                group_by = "category" if input("🗂️ Group by (1) product or (2) category? [1]: ").strip() == "2" else "product"
+                result = get_best_selling_products(days, limit=limit, rank_by=rank_by, group_by=group_by)
 
                 if "error" in result:
                     print(f"❌ {result['error']}")
                 else:
                     print(f"\n📅 Sales Report ({result['start_date']} - {result['end_date']})")
                     if result["best_sellers"]:
-                        print("🏆 Best-Selling Products:")
+                        print("🏆 Best-Selling Products:" if group_by == "product" else "🏆 Best-Selling Categories:")
                         for item in result["best_sellers"]:
-                            print(f"   🔹 {item['name']} (ID: {item['product_id']}) - {item['sold']} units sold")
+                            label = f"{item['name']} (ID: {item['product_id']})" if group_by == "product" else item["category"]
+                            print(f"   🔹 {label} - {item['sold']} units sold, ₹{item['revenue']:.2f}")
                     else:
                         print("⚠️ No sales data available.")
 
@@ -235,20 +257,81 @@ def reports_tab():
             case "3":
                 days = input("📅 Enter number of days (or press Enter for all time): ")
                 days = int(days) if days.strip().isdigit() else None
-                result = get_sales_history(days)
+                customer = get_optional_input("👤 Customer name or phone (or press Enter for all): ")
+                product_id = get_optional_input("📦 Product ID (or press Enter for all): ")
 
+                # Newest first, one page at a time
+                result = get_sales_history_page(days, customer=customer, product_id=product_id)
                 if "error" in result:
                     print(f"❌ {result['error']}")
-                else:
-                    print(f"\n📅 Sales History ({result['start_date']} - {result['end_date']})")
-                    if result["transactions"]:
-                        print("📜 Transactions:")
-                        for txn in result["transactions"]:
-                            print(f"   📅 Date: {txn['date']} | 🆔 Transaction ID: {txn['transaction_id']} | 💰 Amount: ₹{txn['total_price']:.2f}")
-                    else:
-                        print("⚠️ No sales history available.")
+                    continue
+
+                print(f"\n📅 Sales History ({result['start_date']} - {result['end_date']})")
+                if not result["transactions"]:
+                    print("⚠️ No sales history available.")
+                while result["transactions"]:
+                    print("📜 Transactions:")
+                    for txn in result["transactions"]:
+                        print(f"   📅 Date: {txn['date']} | 🆔 Transaction ID: {txn['transaction_id']} | 💰 Amount: ₹{txn['total_price']:.2f}")
+                    if not result["next_cursor"] or input("➡️ Press Enter for more, or 'q' to stop: ").strip().lower() == "q":
+                        break
+                    result = get_sales_history_page(cursor=result["next_cursor"], customer=customer, product_id=product_id)
+                    if "error" in result:
+                        print(f"❌ {result['error']}")
+                        break
 
             case "4":
+                result = rebuild_sales_aggregates()
+                print(f"❌ {result['error']}" if "error" in result else f"✅ {result['message']}")
+
+            case "5":
+                parse_date = lambda value: datetime.strptime(value, "%Y-%m-%d")
+                start = get_optional_input("📅 Start date YYYY-MM-DD (or press Enter for the beginning): ", parse_date)
+                end = get_optional_input("📅 End date YYYY-MM-DD (or press Enter for today): ", parse_date)
+                limit = get_optional_input("🏆 Number of best sellers to show (default = 10): ", int) or 10
+                result = get_sales_analysis(start, end, limit)
+
+                if "error" in result:
+                    print(f"❌ {result['error']}")
+                else:
+                    print(f"\n📈 Sales Analysis ({result['start_date']} - {result['end_date']})")
+                    print(f"💵 Total Revenue: ₹{result['total_revenue']:.2f}")
+                    for item in result["best_sellers"]:
+                        print(f"   🔹 {item['name']} (ID: {item['product_id']}) - {item['sold']} units, ₹{item['revenue']:.2f}")
+
+            case "6":
+                parse_date = lambda value: datetime.strptime(value, "%Y-%m-%d")
+                start = get_optional_input("📅 Start date YYYY-MM-DD (or press Enter for the first sale): ", parse_date)
+                end = get_optional_input("📅 End date YYYY-MM-DD (or press Enter for today): ", parse_date)
+                period = "day" if input("🗓️ Bucket by (1) week or (2) day? [1]: ").strip() == "2" else "week"
+                category = get_optional_input("🗂️ Category (or press Enter for all): ")
+                result = get_sales_trend(start, end, period, category=category)
+
+                if "error" in result:
+                    print(f"❌ {result['error']}")
+                else:
+                    print(f"\n📈 Sales Trend ({result['start_date']} - {result['end_date']}, per {period})")
+                    for item in result["periods"]:
+                        print(f"   🔹 {item['period']} - {item['sold']} units, ₹{item['revenue']:.2f}")
+
+            case "7":
+                parse_date = lambda value: datetime.strptime(value, "%Y-%m-%d")
+                start = get_optional_input("📅 Start date YYYY-MM-DD (or press Enter for the first sale): ", parse_date)
+                end = get_optional_input("📅 End date YYYY-MM-DD (or press Enter for today): ", parse_date)
+                group_by = "category" if input("🗂️ Group by (1) product or (2) category? [1]: ").strip() == "2" else "product"
+                limit = get_optional_input("🏆 Show top how many? (default = 10): ", int) or 10
+                result = get_period_report(start, end, group_by=group_by, limit=limit)
+
+                if "error" in result:
+                    print(f"❌ {result['error']}")
+                else:
+                    print(f"\n📅 Period Report ({result['start_date']} - {result['end_date']})")
+                    print(f"💵 Total Revenue: ₹{result['total_revenue']:.2f} | 📦 Units Sold: {result['total_sold']}")
+                    for item in result["best_sellers"]:
+                        label = f"{item['name']} (ID: {item['product_id']})" if group_by == "product" else item["category"]
+                        print(f"   🔹 {label} - {item['sold']} units, ₹{item['revenue']:.2f}")
+
+            case "8":
                 print("🔙 Returning to Admin Panel...")
                 break
 
@@ -309,14 +392,16 @@ def stock_tab():
         print("\n📦 Stock Management")
         print("1️⃣ Check Low Stock Products")
         print("2️⃣ Refill Stock")
-        print("3️⃣ 🔙 Back to Admin Panel")
+        print("3️⃣ Set Reorder Threshold")
+        print("4️⃣ View Stock Alerts")
+        print("5️⃣ 🔙 Back to Admin Panel")
 
         choice = input("👉 Choose an option: ")
 
         match choice:
             case "1":
-                threshold = input("⚠️ Enter stock threshold (default = 5): ").strip()
-                threshold = int(threshold) if threshold.isdigit() else 5
+                threshold = input("⚠️ Enter stock threshold (default = each product's reorder level): ").strip()
+                threshold = int(threshold) if threshold.isdigit() else None
 
                 low_stock_items = check_stock_levels(threshold)
 
@@ -327,7 +412,7 @@ def stock_tab():
                 else:
                     print("\n⚠️ Low Stock Products:")
                     for item in low_stock_items:
-                        print(f"   🔹 {item['name']} (🆔 {item['product_id']}) - Only {item['quantity']} left!")
+                        print(f"   🔹 {item['name']} (🆔 {item['product_id']}) - Only {item['quantity']} left! (threshold {item['threshold']})")
 
             case "2":
                 product_id = input("🆔 Enter Product ID to refill: ").strip()
@@ -345,12 +430,79 @@ def stock_tab():
                     print(f"✅ {result['message']}")
 
             case "3":
+                product_id = input("🆔 Enter Product ID: ").strip()
+                threshold = input("📉 Reorder when stock falls below (blank = default): ").strip()
+
+                if threshold and not threshold.isdigit():
+                    print("⚠️ Invalid threshold. Please enter a whole number.")
+                    continue
+
+                result = set_reorder_threshold(product_id, int(threshold) if threshold else None)
+
+                if "error" in result:
+                    print(f"❌ {result['error']}")
+                else:
+                    print(f"✅ {result['message']}")
+
+            case "4":
+                alerts = get_stock_alerts()
+
+                if "error" in alerts:
+                    print(f"❌ {alerts['error']}")
+                elif not alerts:
+                    print("✅ No stock alerts yet.")
+                else:
+                    print("\n🔔 Latest Stock Alerts:")
+                    for alert in alerts:
+                        icon = "⚠️" if alert["event"] == "low_stock" else "✅"
+                        print(f"   {icon} {alert['date']} {alert['name']} (🆔 {alert['product_id']}): {alert['previous_quantity']} → {alert['quantity']} (threshold {alert['threshold']})")
+
+            case "5":
                 print("🔙 Returning to Admin Panel...")
                 break
 
             case _:
                 print("⚠️ Invalid choice. Please try again.")
 
+def print_diagnostics():
+    stats = diagnostics.snapshot()
+    totals = stats["totals"]
+    print(f"\n🩺 Diagnostics since {stats['started']}")
+    print(f"   📥 Read: {totals['bytes_read']:,} B | 📤 Written: {totals['bytes_written']:,} B | 🧩 JSON parses: {totals['json_parses']:,}")
+    if not stats["operations"]:
+        print("⚠️ Nothing recorded yet.")
+        return
+    print(f"   {'Operation':<34}{'Calls':>7}{'Errors':>7}{'Mean ms':>10}{'Max ms':>10}{'Read B':>12}{'Parses':>9}")
+    for name, op in stats["operations"].items():
+        print(f"   {name:<34}{op['calls']:>7}{op['errors']:>7}{op['mean_s'] * 1000:>10.2f}{op['max_s'] * 1000:>10.2f}{op['bytes_read']:>12,}{op['json_parses']:>9,}")
+
+def diagnostics_tab():
+    if not diagnostics.ENABLED:
+        print("⚠️ Diagnostics are off. Start the app with STOCK_MASTER_DIAGNOSTICS=1 to collect them.")
+        return
+    while True:
+        print("\n🩺 Diagnostics")
+        print("1️⃣ Show Statistics")
+        print("2️⃣ Save Statistics to File")
+        print("3️⃣ Reset Statistics")
+        print("4️⃣ 🔙 Back to Admin Panel")
+
+        choice = input("👉 Choose an option: ")
+
+        match choice:
+            case "1":
+                print_diagnostics()
+            case "2":
+                print(f"✅ Statistics saved to {diagnostics.dump()}")
+            case "3":
+                diagnostics.reset()
+                print("✅ Statistics cleared.")
+            case "4":
+                print("🔙 Returning to Admin Panel...")
+                return
+            case _:
+                print("⚠️ Invalid choice. Please try again.")
+
 def admin_panel():
     while True:
         print("\n📋 Admin Panel")
@@ -359,7 +511,8 @@ def admin_panel():
         print("3️⃣ Reports Tab")
         print("4️⃣ Sales Tab")
         print("5️⃣ Stock Tab")
-        print("6️⃣ 🚪 Logout")
+        print("6️⃣ Diagnostics 🩺")
+        print("7️⃣ 🚪 Logout")
 
         choice = input("👉 Choose an option: ")
 
@@ -375,6 +528,8 @@ def admin_panel():
             case "5":
                 stock_tab()  # Handles Stock Management
             case "6":
+                diagnostics_tab()  # Timing and I/O statistics
+            case "7":
                 # Logout
                 from authentication import Auth  # Ensure correct import if needed
                 Auth.logout()
@@ -475,12 +630,12 @@ def employee_panel():
 
         elif choice == "5":
             # Check Stock Levels
-            threshold = get_optional_input("👉 Enter Stock Threshold: ", int) or 5
+            threshold = get_optional_input("👉 Enter Stock Threshold (blank = reorder levels): ", int)
             low_stock = check_stock_levels(threshold)
             if low_stock:
                 print("⚠️ Low Stock Items:")
                 for item in low_stock:
-                    print(f"🔹 {item['product_id']}: {item['name']}, Qty: {item['quantity']}")
+                    print(f"🔹 {item['product_id']}: {item['name']}, Qty: {item['quantity']} (threshold {item['threshold']})")
             else:
                 print("✅ All stock levels are sufficient.")
 
@@ -502,14 +657,109 @@ def employee_panel():
             print("⚠️ Invalid option. Please try again.")
 
 
+# One-shot admin commands: python inventory.py <command> [options]
+def command_rebuild_aggregates(args):
+    result = rebuild_sales_aggregates()
+    print(f"❌ {result['error']}" if "error" in result else f"✅ {result['message']}")
+
+def command_import_products(args):
+    result = import_catalog(args.file, overwrite=args.overwrite)
+    if "error" in result:
+        print(f"❌ {result['error']}")
+        return
+    for item in result["errors"]:
+        print(f"   ⚠️ Row {item['row']}: {item['error']}")
+    print(f"✅ {result['message']}")
+
+def command_export_products(args):
+    result = export_catalog(args.file)
+    print(f"❌ {result['error']}" if "error" in result else f"✅ {result['message']}")
+
+def command_add_users(args):
+    result = import_users(args.file, workers=args.workers)
+    if "error" in result:
+        print(f"❌ {result['error']}")
+        return
+    for item in result["errors"]:
+        print(f"   ⚠️ {item['username'] or '(blank)'}: {item['error']}")
+    print(f"✅ {result['message']}")
+
+def command_rehash_passwords(args):
+    result = rehash_passwords(workers=args.workers)
+    print(f"❌ {result['error']}" if "error" in result else f"✅ {result['message']}")
+
+def command_sell_batch(args):
+    result = sell_orders_file(args.file)
+    if "error" in result:
+        print(f"❌ {result['error']}")
+        return
+    for item in result["results"]:
+        if "error" in item:
+            print(f"   ⚠️ Order {item['order']}: {item['error']}")
+    print(f"✅ {result['message']}")
+
+def command_serve(args):
+    # Imported here so the console app doesn't load the server code
+    from server import InventoryServer
+    InventoryServer(args.host, args.port, args.workers).run()
+
+COMMANDS = {
+    "rebuild-aggregates": command_rebuild_aggregates,
+    "import-products": command_import_products,
+    "export-products": command_export_products,
+    "add-users": command_add_users,
+    "rehash-passwords": command_rehash_passwords,
+    "sell-batch": command_sell_batch,
+    "serve": command_serve,
+}
+EMPLOYEE_COMMANDS = {"sell-batch"}  # Open to any logged-in user, like a sale at the till
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Stock Master - Inventory Management System")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("rebuild-aggregates", help="Recompute sales report aggregates from the transaction log")
+
+    import_parser = subparsers.add_parser("import-products", help="Bulk import products from a .csv or .jsonl file")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--overwrite", action="store_true", help="Replace products that already exist")
+
+    export_parser = subparsers.add_parser("export-products", help="Export the catalog to a .csv or .jsonl file")
+    export_parser.add_argument("file")
+
+    users_parser = subparsers.add_parser("add-users", help="Create users in bulk from a .csv or .jsonl file (username, password, role)")
+    users_parser.add_argument("file")
+    users_parser.add_argument("--workers", type=int, help="Password hashing threads (default: one per CPU)")
+
+    rehash_parser = subparsers.add_parser("rehash-passwords", help="Hash any passwords stored in plain text")
+    rehash_parser.add_argument("--workers", type=int, help="Password hashing threads (default: one per CPU)")
+
+    batch_parser = subparsers.add_parser("sell-batch", help="Sell queued orders from a .jsonl file (one order per line), in one stock write")
+    batch_parser.add_argument("file")
+
+    serve_parser = subparsers.add_parser("serve", help="Run the HTTP/JSON server (clients log in with POST /login)")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8080)
+    serve_parser.add_argument("--workers", type=int, default=8, help="Threads for blocking storage I/O")
+    return parser
+
 # Main App
-username = input("Username: ")
-password = input("Password: ")
+def main():
+    args = build_parser().parse_args()
+
+    username = input("Username: ")
+    password = input("Password: ")
 
-if Auth.login(username, password):
-    if Auth.is_admin():
+    if not Auth.login(username, password):
+        print("Invalid login!")
+    elif args.command:
+        if Auth.is_admin() or args.command in EMPLOYEE_COMMANDS:
+            COMMANDS[args.command](args)
+        else:
+            print("⚠️ Access denied. Admins only.")
+    elif Auth.is_admin():
         admin_panel()
     elif Auth.is_employee():
         employee_panel()
-else:
-    print("Invalid login!")
+
+if __name__ == "__main__":
+    main()
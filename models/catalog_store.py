@@ -0,0 +1,321 @@
+import copy
+from array import array
+from collections.abc import ItemsView, MutableMapping, ValuesView
+from itertools import accumulate
+
+_MISSING = 0xFFFFFFFF  # Length recorded for a None value (e.g. a product without an image)
+
+class _TextColumn:
+    """
+    One string per row, packed as UTF-8 into a single bytearray.
+
+    A str object costs ~50 bytes before its first character; here a row costs
+    its encoded text plus 12 bytes of offsets. Overwritten text is left in
+    place and squeezed out by copy() once it makes up most of the buffer.
+    """
+    __slots__ = ("_data", "_starts", "_lengths", "_live")
+
+    def __init__(self, values=()):
+        encoded = [None if text is None else text.encode("utf-8") for text in values]
+        sizes = [0 if chunk is None else len(chunk) for chunk in encoded]
+        self._data = bytearray(b"".join(chunk for chunk in encoded if chunk is not None))
+        self._starts = array("Q", accumulate(sizes[:-1], initial=0) if sizes else ())
+        self._lengths = array("I", (_MISSING if chunk is None else len(chunk) for chunk in encoded))
+        self._live = len(self._data)  # Bytes still referenced by some row
+
+    @classmethod
+    def from_buffers(cls, data, starts, lengths):
+        """Build a column from packed buffers (e.g. snapshot sections); each is copied in one go."""
+        column = cls()
+        column._data = bytearray(data)
+        column._starts = array("Q")
+        column._starts.frombytes(starts)
+        column._lengths = array("I")
+        column._lengths.frombytes(lengths)
+        column._live = sum(column._lengths) - _MISSING * column._lengths.count(_MISSING)
+        return column
+
+    def _store(self, text):
+        if text is None:
+            return 0, _MISSING
+        encoded = text.encode("utf-8")
+        start = len(self._data)
+        self._data += encoded
+        self._live += len(encoded)
+        return start, len(encoded)
+
+    def _release(self, row):
+        if self._lengths[row] != _MISSING:
+            self._live -= self._lengths[row]
+
+    def append(self, text):
+        start, length = self._store(text)
+        self._starts.append(start)
+        self._lengths.append(length)
+
+    def get(self, row):
+        length = self._lengths[row]
+        if length == _MISSING:
+            return None
+        start = self._starts[row]
+        return self._data[start:start + length].decode("utf-8")
+
+    __getitem__ = get
+
+    def __setitem__(self, row, text):
+        self._release(row)
+        self._starts[row], self._lengths[row] = self._store(text)
+
+    def __delitem__(self, row):
+        self._release(row)
+        del self._starts[row]
+        del self._lengths[row]
+
+    def __len__(self):
+        return len(self._starts)
+
+    def __iter__(self):
+        data = self._data
+        for start, length in zip(self._starts, self._lengths):
+            yield None if length == _MISSING else data[start:start + length].decode("utf-8")
+
+    def copy(self):
+        if len(self._data) > 2 * self._live:
+            return _TextColumn(list(self))
+        clone = _TextColumn()
+        clone._data = bytearray(self._data)
+        clone._starts = self._starts[:]
+        clone._lengths = self._lengths[:]
+        clone._live = self._live
+        return clone
+
+class _StoreItems(ItemsView):
+    def __iter__(self):
+        store = self._mapping
+        return zip(store._ids, store._iter_products())
+
+class _StoreValues(ValuesView):
+    def __iter__(self):
+        return self._mapping._iter_products()
+
+class CatalogStore(MutableMapping):
+    """
+    Compact {product_id: Product} catalog in struct-of-arrays layout.
+
+    Every column is one list or array with one entry per product (row):
+    prices and quantities are packed array('d') / array('q') values,
+    categories are interned and stored as small integer codes, and names,
+    image paths and descriptions are packed UTF-8 text columns; only the
+    product IDs stay str objects (they key the row index). No per-product
+    object is kept: reading a product builds a Product snapshot of its row,
+    so existing callers still get Product objects.
+
+    The shared cached catalog is frozen. Writers take copy(), edit it like
+    a dict and save it, so readers of the old catalog never see a change.
+    """
+
+    def __init__(self, product_factory):
+        self._factory = product_factory  # Called as factory(product_id, name, price, quantity, category, img, description)
+        self._index = {}                 # product_id -> row
+        self._ids = []
+        self._names = _TextColumn()
+        self._prices = array("d")
+        self._price_is_int = array("b")  # Keeps 50000 from turning into 50000.0 on the way back out
+        self._quantities = array("q")
+        self._category_codes = array("I")
+        self._categories = []            # code -> category name
+        self._category_code = {}         # category name -> code
+        self._imgs = _TextColumn()
+        self._descriptions = _TextColumn()
+        self._frozen = False
+
+    @classmethod
+    def from_records(cls, records, product_factory):
+        """Build a store from {product_id: dict} records (as returned by a storage backend)."""
+        store = cls(product_factory)
+        rows = list(records.values())
+        store._ids = list(records)
+        store._index = {product_id: row for row, product_id in enumerate(store._ids)}
+        store._names = _TextColumn([data["name"] for data in rows])
+        store._prices = array("d", [data["price"] for data in rows])
+        store._price_is_int = array("b", [isinstance(data["price"], int) for data in rows])
+        store._quantities = array("q", [data["quantity"] for data in rows])
+        store._category_codes = array("I", [store._intern_category(data["category"]) for data in rows])
+        store._imgs = _TextColumn([data["img"] for data in rows])
+        store._descriptions = _TextColumn([data["description"] for data in rows])
+        return store
+
+    @classmethod
+    def from_snapshot(cls, snapshot, product_factory):
+        """Build a store from a storage.catalog_snapshot.CatalogSnapshot; the columns are bulk copies."""
+        def numbers(name, typecode):
+            column = array(typecode)
+            column.frombytes(snapshot.section(name))
+            return column
+
+        def text(name):
+            return _TextColumn.from_buffers(*(snapshot.section(f"{name}_{part}") for part in ("data", "starts", "lengths")))
+
+        store = cls(product_factory)
+        store._ids = snapshot.ids()
+        store._index = dict(zip(store._ids, range(len(store._ids))))
+        store._names = text("names")
+        store._prices = numbers("prices", "d")
+        store._price_is_int = numbers("price_is_int", "b")
+        store._quantities = numbers("quantities", "q")
+        store._category_codes = numbers("category_codes", "I")
+        store._categories = list(text("categories"))
+        store._category_code = {category: code for code, category in enumerate(store._categories)}
+        store._imgs = text("imgs")
+        store._descriptions = text("descriptions")
+        for product_id, quantity in snapshot.quantities.items():
+            row = store._index.get(product_id)
+            if row is not None:
+                store._quantities[row] = quantity
+        return store
+
+    def _intern_category(self, category):
+        code = self._category_code.get(category)
+        if code is None:
+            code = self._category_code[category] = len(self._categories)
+            self._categories.append(category)
+        return code
+
+    def _append(self, product_id, name, price, quantity, category, img, description):
+        self._index[product_id] = len(self._ids)
+        self._ids.append(product_id)
+        self._names.append(name)
+        self._prices.append(price)
+        self._price_is_int.append(isinstance(price, int))
+        self._quantities.append(quantity)
+        self._category_codes.append(self._intern_category(category))
+        self._imgs.append(img)
+        self._descriptions.append(description)
+
+    def _product(self, row):
+        price = self._prices[row]
+        return self._factory(
+            self._ids[row],
+            self._names.get(row),
+            int(price) if self._price_is_int[row] else price,
+            self._quantities[row],
+            self._categories[self._category_codes[row]],
+            self._imgs.get(row),
+            self._descriptions.get(row)
+        )
+
+    def _iter_products(self):
+        # Walks every column side by side; much cheaper than _product() per row
+        factory, categories = self._factory, self._categories
+        columns = zip(self._ids, self._names, self._prices, self._price_is_int, self._quantities,
+                      self._category_codes, self._imgs, self._descriptions)
+        for product_id, name, price, price_is_int, quantity, code, img, description in columns:
+            yield factory(product_id, name, int(price) if price_is_int else price, quantity, categories[code], img, description)
+
+    def _check_writable(self):
+        if self._frozen:
+            raise TypeError("The shared catalog is read-only; edit a copy() instead.")
+
+    # Mapping interface
+    def __getitem__(self, product_id):
+        return self._product(self._index[product_id])
+
+    def __contains__(self, product_id):
+        return product_id in self._index
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def items(self):
+        return _StoreItems(self)
+
+    def values(self):
+        return _StoreValues(self)
+
+    def __setitem__(self, product_id, product):
+        self._check_writable()
+        row = self._index.get(product_id)
+        if row is None:
+            self._append(product_id, product.name, product.price, product.quantity, product.category, product.img, product.description)
+            return
+        self._names[row] = product.name
+        self._prices[row] = product.price
+        self._price_is_int[row] = isinstance(product.price, int)
+        self._quantities[row] = product.quantity
+        self._category_codes[row] = self._intern_category(product.category)
+        self._imgs[row] = product.img
+        self._descriptions[row] = product.description
+
+    def __delitem__(self, product_id):
+        self._check_writable()
+        row = self._index.pop(product_id)
+        for column in (self._ids, self._names, self._prices, self._price_is_int,
+                       self._quantities, self._category_codes, self._imgs, self._descriptions):
+            del column[row]
+        # Later rows moved up by one
+        for moved in range(row, len(self._ids)):
+            self._index[self._ids[moved]] = moved
+
+    # Store-level operations
+    def copy(self):
+        """Return a writable copy (columns are copied in bulk, no Product objects are built)."""
+        clone = CatalogStore(self._factory)
+        clone._index = dict(self._index)
+        clone._ids = list(self._ids)
+        clone._names = self._names.copy()
+        clone._prices = self._prices[:]
+        clone._price_is_int = self._price_is_int[:]
+        clone._quantities = self._quantities[:]
+        clone._category_codes = self._category_codes[:]
+        clone._categories = list(self._categories)
+        clone._category_code = dict(self._category_code)
+        clone._imgs = self._imgs.copy()
+        clone._descriptions = self._descriptions.copy()
+        return clone
+
+    def with_quantities(self, quantities):
+        """
+        Return a frozen copy with new quantities ({product_id: quantity}).
+
+        Only the quantity column is copied; every other column is shared with
+        this store, which must be frozen so neither side can change them.
+        """
+        if not self._frozen:
+            raise TypeError("with_quantities() shares columns; call it on a frozen store.")
+        clone = copy.copy(self)
+        clone._quantities = self._quantities[:]
+        for product_id, quantity in quantities.items():
+            clone._quantities[self._index[product_id]] = quantity
+        return clone
+
+    def freeze(self):
+        """Make the store read-only (done before it is shared as the cached catalog)."""
+        self._frozen = True
+        return self
+
+    def quantity_changes(self, other):
+        """
+        Return [(product_id, quantity in other)] for the rows whose quantity differs in other,
+        or None if other does not have the same rows in the same order.
+
+        Compares the packed quantity columns a block at a time, so only
+        blocks with a change are walked in Python.
+        """
+        if other._ids is not self._ids and other._ids != self._ids:
+            return None
+        mine, theirs = self._quantities, other._quantities
+        changes = []
+        for start in range(0, len(mine), 512):
+            end = start + 512
+            if mine[start:end] != theirs[start:end]:
+                changes.extend(
+                    (self._ids[row], theirs[row]) for row in range(start, min(end, len(mine))) if mine[row] != theirs[row]
+                )
+        return changes
+
+    def quantities(self):
+        """Return (product_id, quantity) pairs straight from the columns, in catalog order."""
+        return zip(self._ids, self._quantities)
@@ -1,8 +1,42 @@
-import json
+import random
 import re
+import threading
+import time
 from authentication import Auth
+from models.catalog_store import CatalogStore
+from models.search_index import CatalogIndexes
+from models.stock_monitor import StockMonitor
+from storage.backend import WriteConflict, get_backend
+from diagnostics import instrument
+
+# Guards the shared catalog cache below (reloads and in-place writes)
+_catalog_lock = threading.RLock()
+
+# Past this many changed products in one write, rebuilding the search indexes is cheaper
+INCREMENTAL_INDEX_LIMIT = 1000
+
+# Optimistic writes: how often to retry after another process changed the catalog first
+MAX_WRITE_RETRIES = 10
+RETRY_BACKOFF = 0.005  # Seconds; the random wait doubles with each attempt, up to MAX_RETRY_BACKOFF
+MAX_RETRY_BACKOFF = 0.5
+CATALOG_BUSY = "Catalog is busy, please try again."
+
+# Fields every imported row must provide
+PRODUCT_FIELDS = ("product_id", "name", "price", "quantity", "category", "img", "description")
 
 class Product:
+    # Products are small snapshots handed out by the catalog store; no per-instance __dict__
+    __slots__ = ("product_id", "name", "price", "quantity", "category", "img", "description")
+
+    # Process-wide catalog cache: a frozen CatalogStore, reloaded only when the
+    # storage signature changes (file mtime/size, DB version) or the version is bumped.
+    _catalog = None
+    _catalog_signature = None
+    _catalog_version = 0
+    # Search indexes over the cached catalog, valid for _search_index_version
+    _search_index = None
+    _search_index_version = None
+
     #Initializes product details ( Constructor )
     def __init__(self, product_id, name, price, quantity, category, img, description):
         self.product_id = product_id
@@ -40,19 +74,122 @@ class Product:
             data["description"]
         )
 
-    #Loads products from JSON and returns a dictionary of Product objects
+    #Returns the shared catalog, re-reading storage only if it changed
+    @staticmethod
+    @instrument("product.get_catalog")
+    def _get_catalog():
+        """Return the cached {product_id: Product} catalog, reloading it if stale."""
+        backend = get_backend()
+        signature = backend.products_signature()
+        with _catalog_lock:
+            if Product._catalog is None or signature != Product._catalog_signature:
+                # The binary snapshot loads with bulk copies; the JSON/DB is read only without one
+                snapshot = backend.products_snapshot(signature)
+                if snapshot is not None:
+                    Product._catalog = CatalogStore.from_snapshot(snapshot, Product).freeze()
+                else:
+                    Product._catalog = CatalogStore.from_records(backend.load_products(), Product).freeze()
+                Product._catalog_signature = signature
+                Product._catalog_version += 1
+            return Product._catalog
+
+    #Writes the catalog to storage and keeps the cache in sync with it
+    @staticmethod
+    @instrument("product.save_catalog")
+    def _save_catalog(products, changed=None, deleted=(), expected=None):
+        """
+        Persist the given catalog and make it the cached copy.
+
+        - expected: Storage signature the catalog was read at; raises WriteConflict
+          (writing nothing) if another process has saved since.
+        """
+        backend = get_backend()
+        with _catalog_lock:
+            signature = backend.save_products(products, changed=changed, deleted=deleted, expected_signature=expected)
+            Product._install_catalog(products.freeze(), signature, changed, deleted)
+
+    #Makes a just-written catalog the cached copy and updates what is derived from it
+    @staticmethod
+    def _install_catalog(products, signature, changed, deleted=()):
+        """Cache a frozen catalog that storage now holds at signature."""
+        with _catalog_lock:
+            index_is_current = Product._search_index_version == Product._catalog_version
+            before, old_version = Product._catalog, Product._catalog_version
+            Product._catalog = products
+            Product._catalog_signature = signature
+            Product._catalog_version += 1
+
+            # Low-stock state and threshold alerts follow the rows this write changed
+            StockMonitor.catalog_changed(before, products, changed, deleted, old_version, Product._catalog_version)
+
+            # Keep the search index in step instead of rebuilding it
+            if index_is_current and changed is not None and len(changed) + len(deleted) <= INCREMENTAL_INDEX_LIMIT:
+                for product_id in deleted:
+                    Product._search_index.remove(product_id)
+                for product_id in changed:
+                    Product._search_index.update(product_id, products[product_id])
+                Product._search_index_version = Product._catalog_version
+
+    #Runs a read-modify-write of the catalog, retrying if another process wrote first
     @staticmethod
+    def _write_catalog(mutate, busy_result=(False, CATALOG_BUSY)):
+        """
+        Apply mutate to a copy of the catalog and save it with an optimistic version check.
+
+        - mutate: Called with a writable copy of the catalog; edits it like a dict and returns
+          (result, changed, deleted). changed=None means "nothing to write".
+          It may run more than once, so it must not have other side effects.
+        - busy_result: Returned if every retry lost the race.
+        """
+        for attempt in range(MAX_WRITE_RETRIES):
+            with _catalog_lock:
+                products = Product._get_catalog().copy()
+                signature = Product._catalog_signature
+                result, changed, deleted = mutate(products)
+                if changed is None:
+                    return result
+                try:
+                    Product._save_catalog(products, changed=changed, deleted=deleted, expected=signature)
+                    return result
+                except WriteConflict:
+                    Product.invalidate_cache()  # Re-read the other writer's catalog and try again
+            time.sleep(random.uniform(0, min(RETRY_BACKOFF * 2 ** attempt, MAX_RETRY_BACKOFF)))
+        return busy_result
+
+    #Returns the cached catalog together with its search indexes, building them if needed
+    @staticmethod
+    def _get_indexed_catalog():
+        """Return (catalog, CatalogIndexes) for the current cached catalog."""
+        with _catalog_lock:
+            catalog = Product._get_catalog()
+            if Product._search_index_version != Product._catalog_version:
+                Product._search_index = CatalogIndexes(catalog)
+                Product._search_index_version = Product._catalog_version
+            return catalog, Product._search_index
+
+    #Drops the cached catalog so the next read goes back to disk
+    @staticmethod
+    def invalidate_cache():
+        """Force the next catalog read to reload from storage."""
+        with _catalog_lock:
+            Product._catalog = None
+            Product._catalog_signature = None
+            Product._catalog_version += 1
+
+    @staticmethod
+    def catalog_version():
+        """Return a counter that changes whenever the cached catalog changes."""
+        return Product._catalog_version
+
+    #Loads products from JSON and returns a read-only {product_id: Product} mapping
+    @staticmethod
+    @instrument("product.load_products")
     def load_products():
         """Login Required"""
         if not Auth.get_logged_in_user():
             return {"error": "Access denied. Login required."}
-        PRODUCTS_FILE = "database/products.json"
-        try:
-            with open(PRODUCTS_FILE, "r") as file:
-                data = json.load(file)
-            return {pid: Product.from_dict(pid, pdata) for pid, pdata in data.items()}
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+        # The shared catalog is read-only, so no copy is needed
+        return Product._get_catalog()
     
     #Adds a new product and saves to JSON
     @staticmethod
@@ -63,37 +200,90 @@ class Product:
         
         
         """Add a new product after validation and save to JSON."""
-        PRODUCTS_FILE = "database/products.json"
 
         # Validate inputs before proceeding
         is_valid, error_message = Product.validate_product_data(product_id, name, price, quantity, category, img, description)
         if not is_valid:
             return False, error_message
 
-        # Load existing products
-        products = Product.load_products()
+        def add(products):
+            # Check if product ID already exists
+            if product_id in products:
+                return (False, "Product ID already exists!"), None, ()
 
-        # Check if product ID already exists
-        if product_id in products:
-            return False, "Product ID already exists!"
+            # Create new product object
+            products[product_id] = Product(product_id, name, price, quantity, category, img, description)
+            return (True, "Product added successfully!"), [product_id], ()
 
-        # Create new product object
-        new_product = Product(product_id, name, price, quantity, category, img, description)
-        products[product_id] = new_product
+        # Save updated products (also refreshes the cache)
+        return Product._write_catalog(add)
 
-        # Save updated products to JSON
-        with open(PRODUCTS_FILE, "w") as file:
-            json.dump({pid: prod.to_dict() for pid, prod in products.items()}, file, indent=4)
+    #Adds many products at once, validating each row and saving the catalog once
+    @staticmethod
+    def import_products(rows, overwrite=False):
+        """
+        Only admins can import products.
 
-        return True, "Product added successfully!"
+        - rows: Iterable of dicts with the product fields (values may be strings, as read from CSV).
+        - overwrite: Replace existing products instead of reporting them as errors.
+
+        Returns (imported_count, errors) where errors is a list of (row_number, message).
+        """
+        if not Auth.is_admin():
+            return 0, [(0, "Access denied. Admins only.")]
+
+        # Validate every row up front; only the duplicate check needs the catalog
+        errors = []
+        valid = []
+        for row_number, row in enumerate(rows, start=1):
+            missing = [field for field in PRODUCT_FIELDS if row.get(field) in (None, "")]
+            if missing:
+                errors.append((row_number, f"Missing field(s): {', '.join(missing)}"))
+                continue
+
+            try:
+                price = row["price"] if isinstance(row["price"], (int, float)) else float(row["price"])
+                quantity = row["quantity"] if isinstance(row["quantity"], int) else int(row["quantity"])
+            except (TypeError, ValueError):
+                errors.append((row_number, "Price must be a number and Quantity must be an integer!"))
+                continue
+
+            product = Product(
+                str(row["product_id"]).strip(), row["name"], price, quantity,
+                row["category"], row["img"], row["description"]
+            )
+            is_valid, error_message = Product.validate_product_data(
+                product.product_id, product.name, product.price, product.quantity,
+                product.category, product.img, product.description
+            )
+            if not is_valid:
+                errors.append((row_number, error_message))
+                continue
+            valid.append((row_number, product))
+
+        def merge(products):
+            duplicates = []
+            imported = []
+            for row_number, product in valid:
+                if product.product_id in products and not overwrite:
+                    duplicates.append((row_number, "Product ID already exists!"))
+                    continue
+                products[product.product_id] = product
+                imported.append(product.product_id)
+
+            result = (len(imported), sorted(errors + duplicates))
+            # One write for the whole import
+            return result, (list(dict.fromkeys(imported)) if imported else None), ()
+
+        return Product._write_catalog(merge, busy_result=(0, errors + [(0, CATALOG_BUSY)]))
 
     #Validates product data before adding to inventory
     @staticmethod
     def validate_product_data(product_id, name, price, quantity, category, img, description):
         """Validate product inputs before adding to inventory."""
 
-        # Validate product ID format (P101, P102, etc.)
-        if not re.match(r"^P\d{3}$", product_id):
+        # Validate product ID format (P101, P102, ... P100000)
+        if not (isinstance(product_id, str) and re.match(r"^P\d{3,}$", product_id)):
             return False, "Invalid Product ID! Use format: P101"
 
         # Validate name, category, and description (non-empty)
@@ -118,45 +308,116 @@ class Product:
         
         """Update product details in the inventory."""
 
-        # Load products
-        products = Product.load_products()
-
-        # Check if product exists
-        if product_id not in products:
-            return False, "❌ Product ID not found!"
-
-        # Get existing product
-        product = products[product_id]
-
-        # Prepare updated values (keep existing values if None)
-        updated_data = {
-            "product_id": product_id,  # Required for validation
-            "name": name if name is not None else product.name,
-            "price": price if price is not None else product.price,
-            "quantity": quantity if quantity is not None else product.quantity,
-            "category": category if category is not None else product.category,
-            "img": img if img is not None else product.img,
-            "description": description if description is not None else product.description,
-        }
+        def update(products):
+            # Check if product exists
+            if product_id not in products:
+                return (False, "❌ Product ID not found!"), None, ()
+
+            # Get existing product
+            product = products[product_id]
+
+            # Prepare updated values (keep existing values if None)
+            updated_data = {
+                "product_id": product_id,  # Required for validation
+                "name": name if name is not None else product.name,
+                "price": price if price is not None else product.price,
+                "quantity": quantity if quantity is not None else product.quantity,
+                "category": category if category is not None else product.category,
+                "img": img if img is not None else product.img,
+                "description": description if description is not None else product.description,
+            }
+
+            # Validate updated data using existing function
+            is_valid, error_message = Product.validate_product_data(**updated_data)
+            if not is_valid:
+                return (False, error_message), None, ()
+
+            # Apply updates on a fresh object so readers holding the old one are unaffected
+            products[product_id] = Product(**updated_data)
+            return (True, "✅ Product updated successfully!"), [product_id], ()
+
+        # Save updated products (also refreshes the cache)
+        return Product._write_catalog(update)
+
+    #Applies several stock changes in one pass and logs them with one write
+    @staticmethod
+    @instrument("product.adjust_stock")
+    def adjust_stock(changes, transaction=None):
+        """
+        Apply stock deltas to the catalog and persist them in a single write.
 
-        # Validate updated data using existing function
-        is_valid, error_message = Product.validate_product_data(**updated_data)
-        if not is_valid:
-            return False, error_message
+        - changes: Dict {product_id: delta}, e.g. {"P101": -2, "P102": 5}.
+        - transaction: Optional Transaction stored together with the change (a sale),
+          so storage never holds one without the other.
+
+        Returns (True, {product_id: new_quantity}) or (False, error message).
+        Nothing is written unless every change is valid.
+        """
+        return Product.apply_stock_changes([(changes, transaction)])[0]
+
+    #Checks a list of stock changes in order and logs the accepted ones with one write
+    @staticmethod
+    @instrument("product.apply_stock_changes")
+    def apply_stock_changes(batch):
+        """
+        Apply a list of (changes, transaction) entries, each as for adjust_stock.
 
-        # Apply updates
-        product.name = updated_data["name"]
-        product.price = updated_data["price"]
-        product.quantity = updated_data["quantity"]
-        product.category = updated_data["category"]
-        product.img = updated_data["img"]
-        product.description = updated_data["description"]
+        Entries are checked in order, each against the stock the accepted ones
+        before it left behind; a rejected entry changes nothing. Every accepted
+        entry goes to the backend's stock log in one write, and this returns
+        once the log is on disk (sales logged meanwhile by other threads share
+        that disk flush).
 
-        # Save updated products to JSON
-        with open("database/products.json", "w") as file:
-            json.dump({pid: prod.to_dict() for pid, prod in products.items()}, file, indent=4)
+        Returns one (True, {product_id: new_quantity}) or (False, error message) per entry.
+        """
+        if not Auth.get_logged_in_user():
+            return [(False, "Access denied. Login required.")] * len(batch)
+
+        backend = get_backend()
+        for attempt in range(MAX_WRITE_RETRIES):
+            with _catalog_lock:
+                products = Product._get_catalog()
+                quantities = {}  # Stock after the entries accepted so far
+                results = []
+                records = []
+                for changes, transaction in batch:
+                    new_quantities = {}
+                    for product_id, delta in changes.items():
+                        if product_id not in products:
+                            results.append((False, f"Product {product_id} not found."))
+                            break
+                        new_quantity = quantities.get(product_id, products[product_id].quantity) + delta
+                        if new_quantity < 0:
+                            results.append((False, f"Not enough stock for {products[product_id].name}."))
+                            break
+                        new_quantities[product_id] = new_quantity
+                    else:
+                        quantities.update(new_quantities)
+                        results.append((True, new_quantities))
+                        records.append({"quantities": new_quantities, "transaction": transaction})
+                if not records:
+                    return results
+
+                try:
+                    signature, ticket = backend.log_stock_changes(records, expected_signature=Product._catalog_signature)
+                except WriteConflict:
+                    Product.invalidate_cache()  # Re-read the other writer's catalog and try again
+                else:
+                    # Only the quantity column is copied; readers holding the old catalog are unaffected
+                    Product._install_catalog(products.with_quantities(quantities), signature, list(quantities))
+                    break
+            time.sleep(random.uniform(0, min(RETRY_BACKOFF * 2 ** attempt, MAX_RETRY_BACKOFF)))
+        else:
+            return [(False, CATALOG_BUSY)] * len(batch)
+
+        # Wait for the disk outside the lock, so the next sales can log behind these
+        backend.flush_stock_log(ticket)
+        return results
 
-        return True, "✅ Product updated successfully!"
+    @staticmethod
+    def catalog_lock():
+        """Return the lock guarding catalog writes (hold it to group several writes)."""
+        return _catalog_lock
 
     #Deletes a product from the inventory
     @staticmethod
@@ -167,33 +428,39 @@ class Product:
         
         """Delete a product from the inventory."""
         
-        # Load existing products
-        products = Product.load_products()
+        def delete(products):
+            # Check if product exists
+            if product_id not in products:
+                return (False, "❌ Product ID not found!"), None, ()
 
-        # Check if product exists
-        if product_id not in products:
-            return False, "❌ Product ID not found!"
+            # Remove product
+            del products[product_id]
+            return (True, "✅ Product deleted successfully!"), [], [product_id]
 
-        # Remove product
-        del products[product_id]
-
-        # Save updated products to JSON
-        with open("database/products.json", "w") as file:
-            json.dump({pid: prod.to_dict() for pid, prod in products.items()}, file, indent=4)
-
-        return True, "✅ Product deleted successfully!"
+        # Save updated products (also refreshes the cache)
+        return Product._write_catalog(delete)
     
     # All Search Functions
 
     #Search for a product by its ID
     @staticmethod
+    @instrument("product.search_by_id")
     def search_by_id(product_id):
         """Search for a product by its ID."""
-        products = Product.load_products()
-        
-        return products.get(product_id, None)
+        if not Auth.get_logged_in_user():
+            return None
+        backend = get_backend()
+        catalog = Product._catalog
+        if catalog is None or backend.products_signature() != Product._catalog_signature:
+            if backend.indexed_lookups:
+                # Indexed single-row read (DB index or mapped snapshot) instead of loading the whole catalog
+                data = backend.get_product(product_id)
+                return Product.from_dict(product_id, data) if data else None
+            catalog = Product._get_catalog()
+        return catalog.get(product_id, None)
 
     @staticmethod
+    @instrument("product.search_products")
     def search_products(product_id=None, price_range=None, quantity_range=None, keyword=None):
         """
         Search products based on multiple filters.
@@ -205,10 +472,18 @@ class Product:
         """
         if not Auth.get_logged_in_user():
             return {"error": "Access denied. Login required."}
-        products = Product.load_products()
         results = []
-
-        for product in products.values():
+        with _catalog_lock:
+            # Writers update the shared indexes in place, so they only match this catalog under the lock
+            catalog, indexes = Product._get_indexed_catalog()
+            # Start from the most selective filter; the loop below checks the rest
+            candidate_ids = indexes.candidates(product_id, price_range, quantity_range, keyword)
+        if candidate_ids is None:
+            candidates = catalog.values()
+        else:
+            candidates = [catalog[pid] for pid in candidate_ids]
+
+        for product in candidates:
             match = True
 
             # Search by Product ID (exact match)
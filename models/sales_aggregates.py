@@ -0,0 +1,279 @@
+import atexit
+import threading
+from datetime import date, timedelta
+from functools import lru_cache
+from models.product import Product
+from storage.backend import StaleTransactionPosition, get_backend
+from diagnostics import instrument
+
+AGGREGATES_DOCUMENT = "sales_aggregates"  # Stored next to the transactions by the backend
+PERSIST_EVERY = 100  # Save a snapshot after this many newly applied transactions
+DELETED_CATEGORY = "Deleted product"  # Category of sales of products no longer in the catalog
+ROLLUPS = ("days", "weeks", "category_days", "category_weeks")  # Period buckets, keyed by day or ISO week
+PERIODS = {"day": ("days", "category_days"), "week": ("weeks", "category_weeks")}  # Rollups each period reads
+
+_aggregates_lock = threading.RLock()
+
+@lru_cache(maxsize=4096)
+def iso_week(day):
+    """Return the ISO week key ("2026-W42") of a "YYYY-MM-DD" day."""
+    year, week, _ = date.fromisoformat(day).isocalendar()
+    return f"{year}-W{week:02d}"
+
+class SalesAggregates:
+    """
+    Materialized sales totals kept in step with the transaction history.
+
+    State layout (also the persisted document):
+        {
+            "position": <transaction position the totals include>,
+            "total_revenue": float,
+            "products": {product_id: [units_sold, revenue]},
+            "days": {"YYYY-MM-DD": {product_id: [units_sold, revenue]}},
+            "weeks": {"YYYY-Www": {product_id: [units_sold, revenue]}},
+            "category_days": {"YYYY-MM-DD": {category: [units_sold, revenue]}},
+            "category_weeks": {"YYYY-Www": {category: [units_sold, revenue]}}
+        }
+
+    Weeks are ISO weeks (Monday to Sunday). A sale counts towards the
+    category its product had when the sale was aggregated. Range queries read
+    whole weeks from the weekly rollups and only the days at either edge from
+    the daily ones, so a year of history is about 52 buckets.
+
+    The snapshot is saved every PERSIST_EVERY transactions (and at exit);
+    anything recorded after its position is replayed from the transaction
+    store on load, so the totals never miss a sale.
+    """
+    _state = None
+    _unsaved = 0  # Transactions applied since the last snapshot
+
+    @staticmethod
+    def _empty_state():
+        return {"position": None, "total_revenue": 0, "products": {}, **{rollup: {} for rollup in ROLLUPS}}
+
+    @staticmethod
+    def _category_lookup():
+        """Return category_of(product_id) over the current catalog, loaded on first use."""
+        catalog = None
+        categories = {}
+
+        def category_of(product_id):
+            nonlocal catalog
+            if product_id not in categories:
+                if catalog is None:
+                    catalog = Product._get_catalog()  # Cached catalog; read once per catch-up
+                categories[product_id] = catalog[product_id].category if product_id in catalog else DELETED_CATEGORY
+            return categories[product_id]
+
+        return category_of
+
+    @staticmethod
+    def _add(bucket, key, units, revenue):
+        entry = bucket.setdefault(key, [0, 0])
+        entry[0] += units
+        entry[1] += revenue
+
+    @staticmethod
+    def _apply(state, record, category_of):
+        """Add one transaction record to the totals and its day's and week's rollups."""
+        day = record["date"][:10]
+        week = iso_week(day)
+        product_buckets = (state["products"], state["days"].setdefault(day, {}), state["weeks"].setdefault(week, {}))
+        category_buckets = (state["category_days"].setdefault(day, {}), state["category_weeks"].setdefault(week, {}))
+        for product_id, quantity, price in zip(record["product_ids"], record["quantities"], record["prices"]):
+            revenue = quantity * price
+            for bucket in product_buckets:
+                SalesAggregates._add(bucket, product_id, quantity, revenue)
+            category = category_of(product_id)
+            for bucket in category_buckets:
+                SalesAggregates._add(bucket, category, quantity, revenue)
+            state["total_revenue"] += revenue
+
+    @staticmethod
+    def _add_rollups(state):
+        """Derive the weekly and category rollups of a state that has only "days" (e.g. from the analytics engine)."""
+        category_of = SalesAggregates._category_lookup()
+        state["weeks"], state["category_days"], state["category_weeks"] = {}, {}, {}
+        for day, bucket in state["days"].items():
+            week_bucket = state["weeks"].setdefault(iso_week(day), {})
+            category_day = state["category_days"].setdefault(day, {})
+            category_week = state["category_weeks"].setdefault(iso_week(day), {})
+            for product_id, (units, revenue) in bucket.items():
+                SalesAggregates._add(week_bucket, product_id, units, revenue)
+                category = category_of(product_id)
+                SalesAggregates._add(category_day, category, units, revenue)
+                SalesAggregates._add(category_week, category, units, revenue)
+        return state
+
+    @staticmethod
+    def _catch_up(state):
+        """Apply every transaction recorded after state["position"]; returns how many."""
+        backend = get_backend()
+        category_of = SalesAggregates._category_lookup()
+        applied = 0
+        for record, position in backend.iter_transactions_since(state["position"]):
+            SalesAggregates._apply(state, record, category_of)
+            state["position"] = position
+            applied += 1
+        if state["position"] is None:
+            state["position"] = backend.transactions_position()
+        return applied
+
+    @staticmethod
+    @instrument("aggregates.refresh")
+    def refresh():
+        """Bring the aggregates up to date with the transaction store and return them."""
+        with _aggregates_lock:
+            if SalesAggregates._state is None:
+                SalesAggregates._state = get_backend().load_document(AGGREGATES_DOCUMENT)
+                if SalesAggregates._state is None or not all(rollup in SalesAggregates._state for rollup in ROLLUPS):
+                    return SalesAggregates.rebuild()  # Missing, or saved before the weekly and category rollups
+
+            try:
+                applied = SalesAggregates._catch_up(SalesAggregates._state)
+            except StaleTransactionPosition:
+                # The history was rewritten under us; start over from the raw log
+                return SalesAggregates.rebuild()
+
+            SalesAggregates._unsaved += applied
+            if SalesAggregates._unsaved >= PERSIST_EVERY:
+                SalesAggregates.save()
+            return SalesAggregates._state
+
+    @staticmethod
+    @instrument("aggregates.rebuild")
+    def rebuild():
+        """Recompute the aggregates from the full transaction history and save them."""
+        with _aggregates_lock:
+            state = SalesAggregates._empty_state()
+            SalesAggregates._catch_up(state)
+            SalesAggregates._state = state
+            SalesAggregates.save()
+            return state
+
+    @staticmethod
+    def replace(state):
+        """Install a freshly computed state (e.g. from the analytics engine) and save it."""
+        with _aggregates_lock:
+            if not all(rollup in state for rollup in ROLLUPS):
+                SalesAggregates._add_rollups(state)
+            SalesAggregates._state = state
+            SalesAggregates.save()
+            return state
+
+    @staticmethod
+    @instrument("aggregates.save")
+    def save():
+        """Persist the in-memory aggregates."""
+        with _aggregates_lock:
+            if SalesAggregates._state is not None:
+                get_backend().save_document(AGGREGATES_DOCUMENT, SalesAggregates._state)
+                SalesAggregates._unsaved = 0
+
+    @staticmethod
+    def _range_buckets(state, start_day, end_day, by_category=False):
+        """
+        Yield the rollup buckets that exactly cover start_day..end_day (inclusive dates).
+
+        Every Monday-to-Sunday week inside the range is one weekly bucket; only
+        the days before the first and after the last whole week are read per day.
+        """
+        days = state["category_days" if by_category else "days"]
+        weeks = state["category_weeks" if by_category else "weeks"]
+        day = start_day
+        while day <= end_day:
+            if day.weekday() == 0 and day + timedelta(days=6) <= end_day:
+                bucket = weeks.get(iso_week(day.isoformat()))
+                day += timedelta(days=7)
+            else:
+                bucket = days.get(day.isoformat())
+                day += timedelta(days=1)
+            if bucket:
+                yield bucket
+
+    @staticmethod
+    def _bounds(state, start_day, end_day):
+        """Clamp "YYYY-MM-DD" bounds (None = unbounded) to the recorded days; returns dates, or None if nothing is recorded."""
+        if not state["days"]:
+            return None
+        first, last = min(state["days"]), max(state["days"])
+        start_day = max(start_day or first, first)
+        end_day = min(end_day or last, last)
+        return date.fromisoformat(start_day), date.fromisoformat(end_day)
+
+    @staticmethod
+    def _totals(state, start_day, end_day, by_category):
+        totals = {}
+        total_revenue = 0
+        bounds = SalesAggregates._bounds(state, start_day, end_day)
+        if bounds is None:
+            return totals, total_revenue
+        for bucket in SalesAggregates._range_buckets(state, *bounds, by_category=by_category):
+            for key, (units, revenue) in bucket.items():
+                SalesAggregates._add(totals, key, units, revenue)
+                total_revenue += revenue
+        return totals, total_revenue
+
+    @staticmethod
+    def product_totals(start_day=None, end_day=None):
+        """
+        Return ({product_id: [units_sold, revenue]}, total_revenue) for a day range.
+
+        - start_day / end_day: "YYYY-MM-DD" strings, inclusive; None = unbounded.
+        """
+        with _aggregates_lock:
+            state = SalesAggregates.refresh()
+            if start_day is None and end_day is None:
+                return state["products"], state["total_revenue"]
+            return SalesAggregates._totals(state, start_day, end_day, by_category=False)
+
+    @staticmethod
+    def category_totals(start_day=None, end_day=None):
+        """Return ({category: [units_sold, revenue]}, total_revenue) for a day range (as product_totals)."""
+        with _aggregates_lock:
+            return SalesAggregates._totals(SalesAggregates.refresh(), start_day, end_day, by_category=True)
+
+    @staticmethod
+    def period_series(start_day, end_day, period="week", product_id=None, category=None):
+        """
+        Return [(period_key, first_day, units_sold, revenue)] for every day or ISO week
+        from start_day to end_day ("YYYY-MM-DD", inclusive), oldest first.
+
+        Periods without sales are included with zero totals. A week at either
+        edge counts whole, even where it reaches past the range. Totals cover
+        one product (product_id), one category, or the whole store.
+        """
+        product_rollup, category_rollup = PERIODS[period]
+        start, end = date.fromisoformat(start_day), date.fromisoformat(end_day)
+        if period == "week":
+            start -= timedelta(days=start.weekday())
+        step = timedelta(days=7 if period == "week" else 1)
+
+        with _aggregates_lock:
+            state = SalesAggregates.refresh()
+            buckets = state[product_rollup if product_id is not None else category_rollup]
+            series = []
+            while start <= end:
+                key = iso_week(start.isoformat()) if period == "week" else start.isoformat()
+                bucket = buckets.get(key, {})
+                if product_id is not None or category is not None:
+                    units, revenue = bucket.get(product_id if product_id is not None else category, (0, 0))
+                else:
+                    units = sum(entry[0] for entry in bucket.values())
+                    revenue = sum(entry[1] for entry in bucket.values())
+                series.append((key, start.isoformat(), units, revenue))
+                start += step
+            return series
+
+    @staticmethod
+    def first_day():
+        """Return the earliest day with recorded sales, or None."""
+        days = SalesAggregates.refresh()["days"]
+        return min(days) if days else None
+
+
+def _save_on_exit():
+    if SalesAggregates._unsaved:
+        SalesAggregates.save()
+
+atexit.register(_save_on_exit)
@@ -0,0 +1,259 @@
+import re
+from bisect import bisect_left, bisect_right, insort
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Fields covered by keyword search (same as Product.search_products)
+KEYWORD_FIELDS = ("name", "category", "description")
+
+def tokenize(text):
+    """Split text into lowercase word tokens."""
+    return TOKEN_PATTERN.findall(text.lower())
+
+class KeywordIndex:
+    """
+    Inverted index for keyword search over product name, category and description.
+
+    Maps token -> set of product IDs. Every token's suffixes are kept in a
+    sorted list, so a bisect prefix lookup over them finds all tokens that
+    *contain* a query fragment. That keeps the substring semantics
+    search_products has always had, without scanning the catalog.
+    """
+
+    def __init__(self):
+        self.postings = {}        # token -> set(product_id)
+        self.product_tokens = {}  # product_id -> set(token), needed to update/remove
+        self._suffixes = []       # sorted "suffix\0token" entries for every indexed token
+
+    @classmethod
+    def build(cls, products):
+        """Build an index from a {product_id: Product} catalog."""
+        index = cls()
+        postings = index.postings
+        for product_id, product in products.items():
+            tokens = cls._product_tokens(product)
+            for token in tokens:
+                ids = postings.get(token)
+                if ids is None:
+                    postings[token] = ids = set()
+                ids.add(product_id)
+            index.product_tokens[product_id] = tokens
+        # One sort for the whole catalog; insort per suffix would shift the list every time
+        index._suffixes = sorted(f"{token[i:]}\0{token}" for token in postings for i in range(len(token)))
+        return index
+
+    @staticmethod
+    def _product_tokens(product):
+        tokens = set()
+        for field in KEYWORD_FIELDS:
+            tokens.update(tokenize(getattr(product, field)))
+        return tokens
+
+    def _add_token(self, token, product_id):
+        ids = self.postings.get(token)
+        if ids is None:
+            self.postings[token] = ids = set()
+            for i in range(len(token)):
+                insort(self._suffixes, f"{token[i:]}\0{token}")
+        ids.add(product_id)
+
+    def _remove_token(self, token, product_id):
+        ids = self.postings[token]
+        ids.discard(product_id)
+        if not ids:
+            del self.postings[token]
+            for i in range(len(token)):
+                entry = f"{token[i:]}\0{token}"
+                pos = bisect_left(self._suffixes, entry)
+                del self._suffixes[pos]
+
+    def add(self, product_id, product):
+        """Index a new product."""
+        tokens = self._product_tokens(product)
+        for token in tokens:
+            self._add_token(token, product_id)
+        self.product_tokens[product_id] = tokens
+
+    def update(self, product_id, product):
+        """Re-index a product after a change (only touches tokens that changed)."""
+        old_tokens = self.product_tokens.get(product_id)
+        if old_tokens is None:
+            self.add(product_id, product)
+            return
+        new_tokens = self._product_tokens(product)
+        for token in old_tokens - new_tokens:
+            self._remove_token(token, product_id)
+        for token in new_tokens - old_tokens:
+            self._add_token(token, product_id)
+        self.product_tokens[product_id] = new_tokens
+
+    def remove(self, product_id):
+        """Drop a product from the index."""
+        for token in self.product_tokens.pop(product_id, ()):
+            self._remove_token(token, product_id)
+
+    def tokens_containing(self, fragment):
+        """Return every indexed token that contains fragment."""
+        tokens = set()
+        pos = bisect_left(self._suffixes, fragment)
+        while pos < len(self._suffixes) and self._suffixes[pos].startswith(fragment):
+            tokens.add(self._suffixes[pos].split("\0", 1)[1])
+            pos += 1
+        return tokens
+
+    def candidates(self, keyword):
+        """
+        Return the set of product IDs that can match keyword.
+
+        The result is a superset of the real matches (callers still check
+        the substring); None means the keyword has no word characters and
+        the index can't narrow the search.
+        """
+        fragments = set(tokenize(keyword))
+        if not fragments:
+            return None
+
+        result = None
+        # Longest fragments first: they usually have the smallest posting sets
+        for fragment in sorted(fragments, key=len, reverse=True):
+            ids = set()
+            for token in self.tokens_containing(fragment):
+                ids |= self.postings[token]
+            result = ids if result is None else result & ids
+            if not result:
+                return set()
+
+        return result
+
+class SortedIndex:
+    """
+    Secondary index on one numeric field (price or quantity).
+
+    Values and product IDs are kept in two parallel lists sorted by value,
+    so a range is two bisects: O(log n) to count, O(log n + k) to list.
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self._values = []
+        self._ids = []
+        self._value_of = {}  # product_id -> indexed value, needed to update/remove
+
+    @classmethod
+    def build(cls, field, products):
+        """Build an index on field from a {product_id: Product} catalog."""
+        return cls.from_pairs(field, ((product_id, getattr(product, field)) for product_id, product in products.items()))
+
+    @classmethod
+    def from_pairs(cls, field, pairs):
+        """Build an index on field from (product_id, value) pairs."""
+        index = cls(field)
+        pairs = sorted((value, product_id) for product_id, value in pairs)
+        index._values = [value for value, _ in pairs]
+        index._ids = [product_id for _, product_id in pairs]
+        index._value_of = {product_id: value for value, product_id in pairs}
+        return index
+
+    def add(self, product_id, product):
+        value = getattr(product, self.field)
+        pos = bisect_right(self._values, value)
+        self._values.insert(pos, value)
+        self._ids.insert(pos, product_id)
+        self._value_of[product_id] = value
+
+    def remove(self, product_id):
+        value = self._value_of.pop(product_id, None)
+        if value is None:
+            return
+        pos = bisect_left(self._values, value)
+        while self._ids[pos] != product_id:  # Step over other products with the same value
+            pos += 1
+        del self._values[pos]
+        del self._ids[pos]
+
+    def update(self, product_id, product):
+        if self._value_of.get(product_id) == getattr(product, self.field):
+            return
+        self.remove(product_id)
+        self.add(product_id, product)
+
+    def _bounds(self, low, high):
+        start = 0 if low is None else bisect_left(self._values, low)
+        end = len(self._values) if high is None else bisect_right(self._values, high)
+        return start, max(start, end)
+
+    def count(self, low=None, high=None):
+        """Number of products with low <= value <= high (either bound may be None)."""
+        start, end = self._bounds(low, high)
+        return end - start
+
+    def range(self, low=None, high=None):
+        """Product IDs with low <= value <= high (either bound may be None)."""
+        start, end = self._bounds(low, high)
+        return self._ids[start:end]
+
+    def below(self, bound):
+        """(product_id, value) pairs with value < bound, smallest value first."""
+        end = bisect_left(self._values, bound)
+        return list(zip(self._ids[:end], self._values[:end]))
+
+class CatalogIndexes:
+    """
+    All secondary indexes over the cached catalog, plus a small query planner.
+
+    The planner starts from the most selective filter (exact ID, a price or
+    quantity range, or keyword postings) and returns candidate IDs in catalog
+    order; Product.search_products then checks the remaining filters.
+    """
+    # Below this many range candidates, checking the keyword directly is cheaper than the postings
+    SMALL_CANDIDATE_SET = 32
+
+    def __init__(self, products):
+        self.keyword = KeywordIndex.build(products)
+        self.price = SortedIndex.build("price", products)
+        self.quantity = SortedIndex.build("quantity", products)
+        self._order = {product_id: rank for rank, product_id in enumerate(products)}
+        self._next_rank = len(self._order)
+
+    def update(self, product_id, product):
+        """Re-index a product that was added or changed."""
+        if product_id not in self._order:
+            self._order[product_id] = self._next_rank
+            self._next_rank += 1
+        self.keyword.update(product_id, product)
+        self.price.update(product_id, product)
+        self.quantity.update(product_id, product)
+
+    def remove(self, product_id):
+        """Drop a deleted product from every index."""
+        self.keyword.remove(product_id)
+        self.price.remove(product_id)
+        self.quantity.remove(product_id)
+        self._order.pop(product_id, None)
+
+    def candidates(self, product_id=None, price_range=None, quantity_range=None, keyword=None):
+        """
+        Return candidate product IDs in catalog order, or None to scan everything.
+
+        Candidates are a superset of the matches for all given filters.
+        """
+        if product_id:
+            return [product_id] if product_id in self._order else []
+
+        # (estimated size, thunk producing the IDs) for every usable filter
+        plans = []
+        for index, bounds in ((self.price, price_range), (self.quantity, quantity_range)):
+            if bounds and (bounds[0] is not None or bounds[1] is not None):
+                plans.append((index.count(*bounds), lambda index=index, bounds=bounds: index.range(*bounds)))
+
+        best_range = min(plans, key=lambda plan: plan[0]) if plans else None
+        if keyword and (best_range is None or best_range[0] > self.SMALL_CANDIDATE_SET):
+            keyword_ids = self.keyword.candidates(keyword)
+            if keyword_ids is not None:
+                plans.append((len(keyword_ids), lambda: keyword_ids))
+
+        if not plans:
+            return None
+
+        _, produce = min(plans, key=lambda plan: plan[0])
+        return sorted(produce(), key=self._order.__getitem__)
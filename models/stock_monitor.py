@@ -0,0 +1,220 @@
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from models.search_index import SortedIndex
+from storage.backend import get_backend
+
+THRESHOLDS_DOCUMENT = "reorder_thresholds"  # {product_id: threshold}, stored by the backend
+DEFAULT_REORDER_THRESHOLD = int(os.environ.get("STOCK_MASTER_REORDER_THRESHOLD", "5"))
+ALERT_LOG = "stock_alerts.jsonl"  # One JSON event per line, in the backend's data directory
+
+_monitor_lock = threading.RLock()
+
+class StockMonitor:
+    """
+    Reorder thresholds and the low-stock state of the cached catalog.
+
+    Two structures are built once from the catalog's quantity column and then
+    kept in step by every catalog write (Product._save_catalog reports the rows
+    it changed). A catalog that changed elsewhere (another till's write) is
+    compared with the one the structures match, and only the rows whose
+    quantity differs are moved; only a change in the set of rows rebuilds them.
+    No query scans the catalog:
+        - a SortedIndex on quantity: "items below N" is O(log n + k)
+        - {product_id: quantity} of the products below their own threshold: O(k)
+
+    When a write moves a product across its threshold, a "low_stock" (falling
+    below) or "restocked" (back at or above) event is appended to the alert log
+    and passed to every subscribed callback.
+    """
+    _backend = None          # Backend the cached state below belongs to
+    _thresholds = None       # Per-product overrides of DEFAULT_REORDER_THRESHOLD
+    _quantity_index = None
+    _low = None
+    _catalog_version = None  # Product.catalog_version() the two structures match
+    _catalog = None          # The catalog itself (None: rebuild on the next query)
+    _subscribers = []
+
+    @staticmethod
+    def _check_backend():
+        # Cached state belongs to one data directory (benchmarks switch backends)
+        backend = get_backend()
+        if backend is not StockMonitor._backend:
+            StockMonitor._backend = backend
+            StockMonitor._thresholds = None
+            StockMonitor._catalog_version = None
+            StockMonitor._catalog = None
+        return backend
+
+    @staticmethod
+    def thresholds():
+        """Return {product_id: threshold} for products with their own reorder threshold."""
+        with _monitor_lock:
+            backend = StockMonitor._check_backend()
+            if StockMonitor._thresholds is None:
+                StockMonitor._thresholds = backend.load_document(THRESHOLDS_DOCUMENT) or {}
+            return StockMonitor._thresholds
+
+    @staticmethod
+    def threshold(product_id):
+        """Reorder threshold of a product: it is low on stock while quantity < threshold."""
+        return StockMonitor.thresholds().get(product_id, DEFAULT_REORDER_THRESHOLD)
+
+    @staticmethod
+    def set_threshold(product_id, threshold, quantity=None):
+        """
+        Store a product's reorder threshold (None restores the default).
+
+        - quantity: The product's current quantity, to update the low-stock set
+          without waiting for its next rebuild.
+        """
+        with _monitor_lock:
+            thresholds = dict(StockMonitor.thresholds())
+            if threshold is None:
+                thresholds.pop(product_id, None)
+            else:
+                thresholds[product_id] = threshold
+            StockMonitor._backend.save_document(THRESHOLDS_DOCUMENT, thresholds)
+            StockMonitor._thresholds = thresholds
+
+            if StockMonitor._low is not None and quantity is not None:
+                StockMonitor._place(product_id, quantity)
+            else:
+                StockMonitor._catalog_version = None
+                StockMonitor._catalog = None
+
+    @staticmethod
+    def _place(product_id, quantity):
+        """Put one product in or out of the low-stock set."""
+        if quantity < StockMonitor.threshold(product_id):
+            StockMonitor._low[product_id] = quantity
+        else:
+            StockMonitor._low.pop(product_id, None)
+
+    @staticmethod
+    def _sync(catalog, version):
+        """Bring both structures up to the given catalog version."""
+        StockMonitor._check_backend()
+        if StockMonitor._catalog_version == version:
+            return
+        previous = StockMonitor._catalog
+        changes = previous.quantity_changes(catalog) if previous is not None else None
+        if changes is not None:
+            for product_id, quantity in changes:
+                StockMonitor._quantity_index.update(product_id, catalog[product_id])
+                StockMonitor._place(product_id, quantity)
+            StockMonitor._catalog = catalog
+            StockMonitor._catalog_version = version
+            return
+
+        pairs = list(catalog.quantities())
+        thresholds = StockMonitor.thresholds()
+        StockMonitor._quantity_index = SortedIndex.from_pairs("quantity", pairs)
+        StockMonitor._low = {
+            product_id: quantity for product_id, quantity in pairs
+            if quantity < thresholds.get(product_id, DEFAULT_REORDER_THRESHOLD)
+        }
+        StockMonitor._catalog = catalog
+        StockMonitor._catalog_version = version
+
+    @staticmethod
+    def below(catalog, version, bound):
+        """Return [(product_id, quantity)] with quantity < bound, lowest first."""
+        with _monitor_lock:
+            StockMonitor._sync(catalog, version)
+            return StockMonitor._quantity_index.below(bound)
+
+    @staticmethod
+    def low_stock(catalog, version):
+        """Return [(product_id, quantity, threshold)] below their own threshold, lowest first."""
+        with _monitor_lock:
+            StockMonitor._sync(catalog, version)
+            low = sorted(StockMonitor._low.items(), key=lambda item: (item[1], item[0]))
+            return [(product_id, quantity, StockMonitor.threshold(product_id)) for product_id, quantity in low]
+
+    @staticmethod
+    def catalog_changed(before, after, changed, deleted, old_version, new_version):
+        """
+        Called by Product._save_catalog after a catalog write.
+
+        - before/after: The catalog before and after the write (before may be None).
+        - changed/deleted: Product IDs the write touched (changed=None: everything).
+        """
+        if changed is None:
+            with _monitor_lock:
+                StockMonitor._catalog_version = None  # Too broad to patch here; the next query compares catalogs
+            return
+
+        events = []
+        with _monitor_lock:
+            in_sync = StockMonitor._low is not None and StockMonitor._catalog_version == old_version
+            for product_id in changed:
+                product = after[product_id]
+                threshold = StockMonitor.threshold(product_id)
+                old_quantity = before[product_id].quantity if before is not None and product_id in before else None
+                if old_quantity is not None and (old_quantity < threshold) != (product.quantity < threshold):
+                    events.append({
+                        "event": "low_stock" if product.quantity < threshold else "restocked",
+                        "product_id": product_id,
+                        "name": product.name,
+                        "quantity": product.quantity,
+                        "previous_quantity": old_quantity,
+                        "threshold": threshold,
+                        "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    })
+                if in_sync:
+                    StockMonitor._quantity_index.update(product_id, product)
+                    StockMonitor._place(product_id, product.quantity)
+            if in_sync:
+                for product_id in deleted:
+                    StockMonitor._quantity_index.remove(product_id)
+                    StockMonitor._low.pop(product_id, None)
+                StockMonitor._catalog = after
+                StockMonitor._catalog_version = new_version
+
+        if events:
+            StockMonitor._emit(events)
+
+    @staticmethod
+    def _alert_log():
+        return os.path.join(StockMonitor._check_backend().data_dir, ALERT_LOG)
+
+    @staticmethod
+    def _emit(events):
+        # O_APPEND keeps lines from several processes intact
+        with open(StockMonitor._alert_log(), "a", encoding="utf-8") as file:
+            file.write("".join(json.dumps(event) + "\n" for event in events))
+        for event in events:
+            for callback in list(StockMonitor._subscribers):
+                try:
+                    callback(event)
+                except Exception:
+                    pass  # The stock change is already saved; a failing listener must not undo the sale
+
+    @staticmethod
+    def subscribe(callback):
+        """Call callback(event) for every threshold crossing in this process."""
+        StockMonitor._subscribers.append(callback)
+
+    @staticmethod
+    def unsubscribe(callback):
+        if callback in StockMonitor._subscribers:
+            StockMonitor._subscribers.remove(callback)
+
+    @staticmethod
+    def recent_alerts(limit=20):
+        """Return the last limit events from the alert log, newest first."""
+        try:
+            with open(StockMonitor._alert_log(), "r", encoding="utf-8") as file:
+                lines = deque(file, maxlen=limit)
+        except FileNotFoundError:
+            return []
+        alerts = []
+        for line in reversed(lines):
+            try:
+                alerts.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # A line still being written by another process
+        return alerts
@@ -1,5 +1,5 @@
-import json
-from datetime import datetime
+from storage.backend import get_backend, record_timestamp
+from diagnostics import instrument
 
 class Transaction:
     def __init__(self, transaction_id, product_ids, quantities, prices, customer_name, customer_phone, date=None):
@@ -9,7 +9,7 @@ class Transaction:
         self.prices = prices
         self.customer_name = customer_name
         self.customer_phone = customer_phone
-        self.date = date or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.date = date  # None: dated when it is recorded, under the storage lock
 
     def to_dict(self):
         """Convert transaction object to dictionary for JSON storage."""
@@ -36,27 +36,71 @@ class Transaction:
             date=data.get("date")  # Use existing date if available
         )
 
+    # One-shot conversion of the old dict-of-dicts history (JSON storage only)
+    @staticmethod
+    def migrate_legacy_file():
+        """Migrate legacy transaction storage; returns the number of migrated transactions."""
+        return get_backend().migrate_legacy_transactions()
+
+    # Streams transactions from storage without loading them all at once
+    @staticmethod
+    def iter_transactions(start=None, end=None):
+        """
+        Yield Transaction objects in the order they were recorded.
+
+        - start / end: Optional datetimes; only transactions in [start, end]
+          are read, using the store's time index.
+        """
+        backend = get_backend()
+        if start is None and end is None:
+            records = backend.iter_transactions()
+        else:
+            records = backend.iter_transactions_between(
+                int(start.timestamp()) if start else None,
+                int(end.timestamp()) if end else None
+            )
+        for data in records:
+            yield Transaction.from_dict(data["transaction_id"], data)
+
+    # Walks the history newest first, one record at a time, resumable from a cursor
+    @staticmethod
+    def iter_history(cursor=None, since_ts=None):
+        """
+        Yield (Transaction, cursor) newest first.
+
+        - cursor: A cursor yielded earlier; iteration resumes with the next older transaction.
+        - since_ts: Optional epoch seconds; older transactions are skipped, and iteration
+          stops once they are older by more than the history's skew.
+
+        Raises StaleTransactionPosition if the history was rewritten since the cursor was issued.
+        """
+        backend = get_backend()
+        skew = backend.transactions_skew() if since_ts is not None else 0
+        for data, position in backend.iter_transactions_reverse(cursor):
+            # Sales are recorded in time order, give or take the skew of replayed orders,
+            # so past that everything further back is older too
+            ts = record_timestamp(data) if since_ts is not None else None
+            if ts is not None and ts < since_ts:
+                if ts < since_ts - skew:
+                    return
+                continue
+            yield Transaction.from_dict(data["transaction_id"], data), position
+
     # load_transaction returns a dictionary of all transactions
     @staticmethod
+    @instrument("transaction.load_all")
     def load_transactions():
-        """Load all transactions from JSON with proper object conversion."""
-        TRANSACTIONS_FILE = "database/transactions.json"
+        """Load all transactions with proper object conversion."""
+        return {t.transaction_id: t for t in Transaction.iter_transactions()}
 
-        try:
-            with open(TRANSACTIONS_FILE, "r") as file:
-                data = json.load(file)
-            return {tid: Transaction.from_dict(tid, tdata) for tid, tdata in data.items()}
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+    # Records a single transaction with a constant-time append
+    @staticmethod
+    @instrument("transaction.append")
+    def append_transaction(transaction):
+        """Append one transaction (object or dict) to the history."""
+        get_backend().append_transaction(transaction)
 
     @staticmethod
     def save_transactions(transactions):
-        """Save all transactions to JSON."""
-        with open("database/transactions.json", "w") as file:
-            json.dump(
-                {tid: (t.to_dict() if isinstance(t, Transaction) else t) for tid, t in transactions.items()},
-                file,
-                indent=4
-            )
-
-
+        """Replace the whole history with a {transaction_id: transaction} dictionary."""
+        get_backend().save_transactions(transactions.values())
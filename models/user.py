@@ -1,9 +1,29 @@
-import json
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import bcrypt  # Use bcrypt for secure password hashing
+from storage.backend import get_backend
+from diagnostics import instrument
 
-USERS_FILE = "database/users.json"
+# Per-process key for remembering verified credentials without keeping passwords
+_CREDENTIAL_KEY = secrets.token_bytes(32)
+VERIFIED_CACHE_SIZE = 1024  # Users whose last successful login is remembered
+
+ROLES = ("admin", "employee")
+# bcrypt releases the GIL while hashing, so plain threads keep every core busy
+HASH_WORKERS = os.cpu_count() or 1
+
+_users_lock = threading.Lock()
 
 class User:
+    # Cached user table, reloaded only when the storage signature changes
+    _users = None
+    _users_signature = None
+    # username -> (stored bcrypt hash, HMAC of the password that matched it)
+    _verified = {}
     def __init__(self, username, password, role):
         self.username = username
         self.password = password  # Store the already hashed password
@@ -15,35 +35,78 @@ class User:
         salt = bcrypt.gensalt()
         return bcrypt.hashpw(password.encode(), salt).decode()  # Store as a string
 
+    @staticmethod
+    def hash_passwords(passwords, workers=None):
+        """Hash many passwords in parallel; returns the hashes in the same order."""
+        passwords = list(passwords)
+        if len(passwords) <= 1:
+            return [User.hash_password(password) for password in passwords]
+        with ThreadPoolExecutor(max_workers=workers or HASH_WORKERS) as pool:
+            return list(pool.map(User.hash_password, passwords))
+
+    @staticmethod
+    def is_hashed(password):
+        """Return True if a stored password is already a bcrypt hash."""
+        return password.startswith("$2b$")
+
     @staticmethod
     def verify_password(password, hashed_password):
-        if not hashed_password.startswith("$2b$"):  # Check for valid bcrypt format
+        if not User.is_hashed(hashed_password):  # Check for valid bcrypt format
             return False
         """Verify password against the stored hashed version."""
         return bcrypt.checkpw(password.encode(), hashed_password.encode())
 
     @staticmethod
+    @instrument("user.load_users")
     def load_users():
-        """Load all users from JSON file and format them correctly."""
-        try:
-            with open(USERS_FILE, "r") as file:
-                return json.load(file)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return {}
+        """Load all users from storage and format them correctly."""
+        backend = get_backend()
+        signature = backend.users_signature()
+        with _users_lock:
+            if User._users is None or signature is None or signature != User._users_signature:
+                User._users = backend.load_users()
+                User._users_signature = signature
+            return dict(User._users)
 
     @staticmethod
     def save_users(users):
-        """Save users to JSON file."""
-        with open(USERS_FILE, "w") as file:
-            json.dump(users, file, indent=4)
+        """Save all users to storage."""
+        get_backend().save_users(users)
+        User.invalidate_cache()
+
+    @staticmethod
+    def invalidate_cache():
+        """Force the next user lookup to reload from storage."""
+        with _users_lock:
+            User._users = None
+
+    @staticmethod
+    def _credential_digest(username, password):
+        return hmac.new(_CREDENTIAL_KEY, f"{username}\0{password}".encode(), hashlib.sha256).digest()
 
     @classmethod
+    @instrument("user.authenticate")
     def authenticate(cls, username, password):
         """Check if the username and password match a stored user."""
         users = cls.load_users()
-        if username in users and cls.verify_password(password, users[username]["password"]):
-            return cls(username, users[username]["password"], users[username]["role"])  # Return user object
-        return None  # Authentication failed
+        if username not in users:
+            return None  # Authentication failed
+
+        stored_hash = users[username]["password"]
+        digest = cls._credential_digest(username, password)
+        cached = cls._verified.get(username)
+        if cached is not None and cached[0] == stored_hash and hmac.compare_digest(cached[1], digest):
+            # Same password already passed bcrypt against this hash: skip the slow check
+            return cls(username, stored_hash, users[username]["role"])
+
+        if not cls.verify_password(password, stored_hash):
+            return None  # Authentication failed
+
+        with _users_lock:
+            if len(cls._verified) >= VERIFIED_CACHE_SIZE and username not in cls._verified:
+                del cls._verified[next(iter(cls._verified))]  # Evict the oldest entry
+            cls._verified[username] = (stored_hash, digest)
+        return cls(username, stored_hash, users[username]["role"])  # Return user object
 
     @classmethod
     def add_user(cls, username, password, role):
@@ -51,6 +114,56 @@ class User:
         users = cls.load_users()
         if username in users:
             return False  # User already exists
-        users[username] = {"password": cls.hash_password(password), "role": role}
-        cls.save_users(users)
+        get_backend().put_user(username, {"password": cls.hash_password(password), "role": role})
+        cls.invalidate_cache()
         return True  # User successfully added
+
+    @classmethod
+    def add_users(cls, accounts, workers=None):
+        """
+        Add many users at once (only for admin).
+
+        - accounts: Iterable of (username, password, role).
+        - workers: Hashing threads (default: one per CPU).
+
+        Passwords are hashed in parallel and all users are saved in one write.
+        Returns (added_usernames, errors) where errors is a list of (username, message).
+        """
+        users = cls.load_users()
+        accepted = {}
+        errors = []
+        for username, password, role in accounts:
+            username = (username or "").strip()
+            if not username or not password:
+                errors.append((username, "Username and password cannot be empty!"))
+            elif role not in ROLES:
+                errors.append((username, "Invalid role! Use 'admin' or 'employee'."))
+            elif username in users or username in accepted:
+                errors.append((username, "Username already exists!"))
+            else:
+                accepted[username] = (password, role)
+
+        if accepted:
+            hashes = cls.hash_passwords((password for password, _ in accepted.values()), workers)
+            get_backend().put_users({
+                username: {"password": hashed, "role": role}
+                for (username, (_, role)), hashed in zip(accepted.items(), hashes)
+            })
+            cls.invalidate_cache()
+        return list(accepted), errors
+
+    @classmethod
+    def rehash_plaintext_passwords(cls, workers=None):
+        """Replace any plain-text stored passwords with bcrypt hashes; returns how many changed."""
+        users = cls.load_users()
+        plaintext = {username: data for username, data in users.items() if not cls.is_hashed(data["password"])}
+        if not plaintext:
+            return 0
+
+        hashes = cls.hash_passwords((data["password"] for data in plaintext.values()), workers)
+        get_backend().put_users({
+            username: dict(data, password=hashed)
+            for (username, data), hashed in zip(plaintext.items(), hashes)
+        })
+        cls.invalidate_cache()
+        return len(plaintext)
@@ -0,0 +1,331 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qs, urlsplit
+import diagnostics
+from authentication import Auth, SESSION_TTL
+from models.product import Product
+from models.sales_aggregates import SalesAggregates
+from services.reports import get_best_selling_products, get_total_revenue, get_sales_history_page, get_sales_analysis, get_sales_trend, get_period_report, HISTORY_PAGE_SIZE
+from services.sales import parse_quantity, sell_products, sell_products_batch
+from services.stock_management import check_stock_levels, get_stock_alerts, refill_stock, set_reorder_threshold
+
+MAX_BODY_SIZE = 1024 * 1024  # Requests larger than this are rejected
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+class BadRequest(Exception):
+    """Raised by a handler for malformed parameters (answered with 400)."""
+
+class Unauthorized(Exception):
+    """Raised for a missing, unknown or expired session (answered with 401)."""
+
+class Forbidden(Exception):
+    """Raised when the session's user lacks the role an endpoint needs (answered with 403)."""
+
+
+# Query/body parameter helpers
+def _param(query, name, cast=str):
+    values = query.get(name)
+    if not values or values[0].strip() == "":
+        return None
+    try:
+        return cast(values[0])
+    except ValueError:
+        raise BadRequest(f"Invalid value for '{name}'.")
+
+def _date_param(query, name):
+    return _param(query, name, lambda value: datetime.strptime(value, "%Y-%m-%d"))
+
+def _range(low, high):
+    return (low, high) if (low is not None or high is not None) else None
+
+def _require_admin():
+    # The services answer an error dict too; raising here lets clients tell it from bad input
+    if not Auth.is_admin():
+        raise Forbidden("Access denied. Admins only.")
+
+
+# Endpoint handlers: (query, body) -> JSON-serialisable result. They call the
+# same service functions as the console app and run on the worker threads.
+def handle_health(query, body):
+    return {"status": "ok", "catalog_version": Product.catalog_version()}
+
+def handle_login(query, body):
+    try:
+        session = Auth.create_session(str(body["username"]), str(body["password"]))
+    except (KeyError, TypeError):
+        raise BadRequest("Body must contain 'username' and 'password'.")
+    if session is None:
+        raise Unauthorized("Invalid login!")
+    return {"token": session.token, "username": session.user.username, "role": session.user.role, "expires_in": SESSION_TTL}
+
+def handle_logout(query, body):
+    Auth.logout()
+    return {"message": "Logged out successfully!"}
+
+def handle_search(query, body):
+    results = Product.search_products(
+        product_id=_param(query, "product_id"),
+        price_range=_range(_param(query, "min_price", float), _param(query, "max_price", float)),
+        quantity_range=_range(_param(query, "min_qty", int), _param(query, "max_qty", int)),
+        keyword=_param(query, "keyword")
+    )
+    if isinstance(results, dict):
+        return results
+    return {"products": [product.to_dict() for product in results]}
+
+def handle_stock_levels(query, body):
+    result = check_stock_levels(_param(query, "threshold", int))  # No threshold: each product's reorder level
+    return result if isinstance(result, dict) else {"low_stock": result}
+
+def handle_set_threshold(query, body):
+    _require_admin()
+    try:
+        threshold = body["threshold"]
+        return set_reorder_threshold(str(body["product_id"]), None if threshold is None else int(threshold))
+    except (KeyError, TypeError, ValueError):
+        raise BadRequest("Body must contain 'product_id' and an integer (or null) 'threshold'.")
+
+def handle_stock_alerts(query, body):
+    limit = _param(query, "limit", int)
+    result = get_stock_alerts(20 if limit is None else limit)
+    return result if isinstance(result, dict) else {"alerts": result}
+
+def handle_refill(query, body):
+    try:
+        return refill_stock(str(body["product_id"]), parse_quantity(body["quantity"]))
+    except (KeyError, TypeError, ValueError):
+        raise BadRequest("Body must contain 'product_id' and an integer 'quantity'.")
+
+def handle_sell(query, body):
+    try:
+        product_details = [(str(product_id), parse_quantity(quantity)) for product_id, quantity in body["products"]]
+        customer_name = str(body["customer_name"])
+        customer_phone = str(body["customer_phone"])
+    except (KeyError, TypeError, ValueError):
+        raise BadRequest("Body must contain 'products' ([[product_id, quantity], ...]), 'customer_name' and 'customer_phone'.")
+    return sell_products(product_details, customer_name, customer_phone)
+
+def handle_sell_batch(query, body):
+    if not isinstance(body, dict) or not isinstance(body.get("orders"), list):
+        raise BadRequest("Body must contain 'orders': a list of orders, each shaped like a POST /sales body.")
+    return sell_products_batch(body["orders"])
+
+def handle_best_sellers(query, body):
+    return get_best_selling_products(
+        _param(query, "days", int),
+        limit=_param(query, "limit", int),
+        rank_by=_param(query, "rank_by") or "units",
+        group_by=_param(query, "group_by") or "product"
+    )
+
+def handle_revenue(query, body):
+    _require_admin()
+    return get_total_revenue(_param(query, "days", int))
+
+def handle_history(query, body):
+    _require_admin()
+    return get_sales_history_page(
+        _param(query, "days", int),
+        page_size=_param(query, "page_size", int) or HISTORY_PAGE_SIZE,
+        cursor=_param(query, "cursor"),
+        customer=_param(query, "customer"),
+        product_id=_param(query, "product_id")
+    )
+
+def handle_analysis(query, body):
+    _require_admin()
+    return get_sales_analysis(_date_param(query, "start_date"), _date_param(query, "end_date"), _param(query, "limit", int))
+
+def handle_trend(query, body):
+    _require_admin()
+    return get_sales_trend(
+        _date_param(query, "start_date"),
+        _date_param(query, "end_date"),
+        period=_param(query, "period") or "week",
+        product_id=_param(query, "product_id"),
+        category=_param(query, "category")
+    )
+
+def handle_period_report(query, body):
+    _require_admin()
+    return get_period_report(
+        _date_param(query, "start_date"),
+        _date_param(query, "end_date"),
+        group_by=_param(query, "group_by") or "product",
+        rank_by=_param(query, "rank_by") or "units",
+        limit=_param(query, "limit", int)
+    )
+
+def handle_diagnostics(query, body):
+    _require_admin()
+    return diagnostics.snapshot()
+
+ROUTES = {
+    ("GET", "/health"): handle_health,
+    ("POST", "/login"): handle_login,
+    ("POST", "/logout"): handle_logout,
+    ("GET", "/products/search"): handle_search,
+    ("GET", "/stock/low"): handle_stock_levels,
+    ("POST", "/stock/refill"): handle_refill,
+    ("POST", "/stock/threshold"): handle_set_threshold,
+    ("GET", "/stock/alerts"): handle_stock_alerts,
+    ("POST", "/sales"): handle_sell,
+    ("POST", "/sales/batch"): handle_sell_batch,
+    ("GET", "/reports/best-sellers"): handle_best_sellers,
+    ("GET", "/reports/revenue"): handle_revenue,
+    ("GET", "/reports/history"): handle_history,
+    ("GET", "/reports/analysis"): handle_analysis,
+    ("GET", "/reports/trend"): handle_trend,
+    ("GET", "/reports/period"): handle_period_report,
+    ("GET", "/diagnostics"): handle_diagnostics,
+}
+
+# Routes that can be called without a session token
+PUBLIC_ROUTES = {("GET", "/health"), ("POST", "/login")}
+
+def _bearer_token(headers):
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    return token.strip() if scheme.lower() == "bearer" else None
+
+def _run_handler(handler, session, query, payload):
+    """Worker-thread entry point: run the handler as the session's user."""
+    with Auth.use_session(session):
+        return handler(query, payload)
+
+
+class InventoryServer:
+    """
+    Minimal HTTP/1.1 JSON server on asyncio (stdlib only).
+
+    The event loop only parses requests and writes responses; every handler
+    runs on a thread pool, since the services do blocking file/database I/O.
+    The catalog cache and sales aggregates live in this one process and stay
+    warm between requests.
+
+    Clients log in with POST /login and send the returned token as
+    "Authorization: Bearer <token>"; each request runs as that session's user.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8080, workers=8):
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="stock-master")
+
+    @staticmethod
+    def warm_up():
+        """Load the catalog, its search indexes and the sales aggregates before taking requests."""
+        Product._get_indexed_catalog()
+        SalesAggregates.refresh()
+
+    async def _read_request(self, reader):
+        """Return (method, target, headers, body), or None when the client closed the connection."""
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, target, _ = request_line.decode("latin-1").split()
+        except ValueError:
+            raise BadRequest("Malformed request line.")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_BODY_SIZE:
+            raise OverflowError
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target, headers, body
+
+    async def _dispatch(self, method, target, headers, body):
+        """Run the matching handler and return (status, result)."""
+        url = urlsplit(target)
+        handler = ROUTES.get((method, url.path))
+        if handler is None:
+            allowed = any(path == url.path for _, path in ROUTES)
+            return (405, {"error": "Method not allowed."}) if allowed else (404, {"error": "Not found."})
+
+        session = None
+        if (method, url.path) not in PUBLIC_ROUTES:
+            session = Auth.get_session(_bearer_token(headers))
+            if session is None:
+                return 401, {"error": "Please log in: missing, invalid or expired session token."}
+
+        try:
+            payload = json.loads(body) if body else {}
+        except json.JSONDecodeError:
+            return 400, {"error": "Request body must be valid JSON."}
+
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self.executor, _run_handler, handler, session, parse_qs(url.query), payload)
+        except BadRequest as error:
+            return 400, {"error": str(error)}
+        except Unauthorized as error:
+            return 401, {"error": str(error)}
+        except Forbidden as error:
+            return 403, {"error": str(error)}
+        return (400 if isinstance(result, dict) and "error" in result else 200), result
+
+    @staticmethod
+    def _write_response(writer, status, result, keep_alive):
+        data = json.dumps(result).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+        )
+
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one connection (HTTP/1.1 keep-alive) until the client is done."""
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except BadRequest as error:
+                    self._write_response(writer, 400, {"error": str(error)}, False)
+                    break
+                except OverflowError:
+                    self._write_response(writer, 413, {"error": "Request body too large."}, False)
+                    break
+                if request is None:
+                    break
+
+                method, target, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    status, result = await self._dispatch(method, target, headers, body)
+                except Exception as error:
+                    status, result = 500, {"error": f"Internal error: {error}"}
+                self._write_response(writer, status, result, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass  # Client went away mid-request or sent a bad Content-Length
+        finally:
+            writer.close()
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.warm_up)
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        print(f"🌐 Serving Stock Master on http://{self.host}:{self.port} (Ctrl+C to stop)")
+        async with server:
+            await server.serve_forever()
+
+    def run(self):
+        """Run the server until interrupted."""
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print("👋 Server stopped.")
+        finally:
+            self.executor.shutdown(wait=True)
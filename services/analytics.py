@@ -0,0 +1,129 @@
+from array import array
+from storage.backend import get_backend, record_timestamp
+
+try:
+    import numpy as np
+except ImportError:  # Optional: reports fall back to their pure-Python paths
+    np = None
+
+def is_available():
+    """Return True if NumPy is installed and the columnar engine can be used."""
+    return np is not None
+
+class SalesColumns:
+    """
+    Transaction line items flattened into columnar NumPy arrays.
+
+    One row per line item: timestamp, day code, product code, quantity and
+    price. Product IDs and days are dictionary-encoded (product_ids[code],
+    days[code]) so grouping is a bincount instead of a Python loop.
+    """
+
+    def __init__(self, timestamps, day_codes, product_codes, quantities, prices, product_ids, days):
+        self.timestamps = timestamps
+        self.day_codes = day_codes
+        self.product_codes = product_codes
+        self.quantities = quantities
+        self.prices = prices
+        self.product_ids = product_ids
+        self.days = days
+
+    @classmethod
+    def from_records(cls, records):
+        """Build the columns from an iterable of transaction dicts."""
+        timestamps, day_codes, product_codes = array("q"), array("q"), array("q")
+        quantities, prices = array("d"), array("d")
+        product_index, day_index = {}, {}
+
+        for record in records:
+            ts = record_timestamp(record)
+            day_code = day_index.setdefault(record["date"][:10], len(day_index))
+            for product_id, quantity, price in zip(record["product_ids"], record["quantities"], record["prices"]):
+                timestamps.append(ts)
+                day_codes.append(day_code)
+                product_codes.append(product_index.setdefault(product_id, len(product_index)))
+                quantities.append(quantity)
+                prices.append(price)
+
+        return cls(
+            np.frombuffer(timestamps, dtype=np.int64),
+            np.frombuffer(day_codes, dtype=np.int64),
+            np.frombuffer(product_codes, dtype=np.int64),
+            np.frombuffer(quantities, dtype=np.float64),
+            np.frombuffer(prices, dtype=np.float64),
+            list(product_index),
+            list(day_index)
+        )
+
+    @classmethod
+    def load(cls, start_ts=None, end_ts=None):
+        """Load line items in [start_ts, end_ts] (epoch seconds, either may be None)."""
+        backend = get_backend()
+        if start_ts is None and end_ts is None:
+            return cls.from_records(backend.iter_transactions())
+        return cls.from_records(backend.iter_transactions_between(start_ts, end_ts))
+
+    def total_revenue(self):
+        return float(np.dot(self.quantities, self.prices))
+
+    def units_per_product(self):
+        """Units sold per product code."""
+        return np.bincount(self.product_codes, weights=self.quantities, minlength=len(self.product_ids))
+
+    def revenue_per_product(self):
+        """Revenue per product code."""
+        return np.bincount(self.product_codes, weights=self.quantities * self.prices, minlength=len(self.product_ids))
+
+    def top_products(self, limit=None, by="units"):
+        """Return [(product_id, units, revenue)] ranked by units or revenue, best first."""
+        units = self.units_per_product()
+        revenue = self.revenue_per_product()
+        key = revenue if by == "revenue" else units
+        if limit is not None and limit <= 0:
+            return []
+        if limit is not None and limit < len(key):
+            # Partial selection of the winners, then sort only those
+            top = np.argpartition(-key, limit - 1)[:limit]
+            order = top[np.argsort(-key[top], kind="stable")]
+        else:
+            order = np.argsort(-key, kind="stable")
+        return [(self.product_ids[i], int(units[i]), float(revenue[i])) for i in order]
+
+    def daily_product_totals(self):
+        """Return {day: {product_id: [units, revenue]}} grouped in one pass."""
+        n_products = len(self.product_ids)
+        keys, inverse = np.unique(self.day_codes * n_products + self.product_codes, return_inverse=True)
+        units = np.bincount(inverse, weights=self.quantities)
+        revenue = np.bincount(inverse, weights=self.quantities * self.prices)
+
+        totals = {}
+        for key, unit_sum, revenue_sum in zip(keys.tolist(), units.tolist(), revenue.tolist()):
+            day, product_code = divmod(key, n_products)
+            totals.setdefault(self.days[day], {})[self.product_ids[product_code]] = [int(unit_sum), revenue_sum]
+        return totals
+
+
+def build_sales_aggregates():
+    """
+    Compute a full SalesAggregates state from the raw transaction history.
+
+    Same layout as SalesAggregates' state, produced with vectorized grouping.
+    """
+    backend = get_backend()
+    last_position = [None]
+
+    def records():
+        for record, position in backend.iter_transactions_since(None):
+            last_position[0] = position
+            yield record
+
+    columns = SalesColumns.from_records(records())
+    units = columns.units_per_product()
+    revenue = columns.revenue_per_product()
+
+    return {
+        "position": last_position[0] or backend.transactions_position(),
+        "total_revenue": columns.total_revenue(),
+        "products": {pid: [int(units[i]), float(revenue[i])] for i, pid in enumerate(columns.product_ids)},
+        "days": columns.daily_product_totals()
+    }
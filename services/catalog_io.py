@@ -0,0 +1,74 @@
+import csv
+import json
+from models.product import Product, PRODUCT_FIELDS
+from authentication import Auth
+from diagnostics import instrument
+
+def file_format(path):
+    """Return "csv" or "jsonl" based on the file extension."""
+    lowered = path.lower()
+    if lowered.endswith(".csv"):
+        return "csv"
+    if lowered.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return None
+
+def iter_rows(path):
+    """Stream rows (dicts) from a CSV or JSONL file, one at a time."""
+    with open(path, "r", newline="", encoding="utf-8") as file:
+        if file_format(path) == "csv":
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError:
+                    row = {}  # Reported as a row with missing fields
+                yield row if isinstance(row, dict) else {}
+
+# Bulk import from a supplier file (CSV or JSONL)
+@instrument("catalog_io.import_catalog")
+def import_catalog(path, overwrite=False):
+    """Allow only admins to import products in bulk."""
+    if not Auth.is_admin():
+        return {"error": "Access denied. Admins only."}
+
+    if file_format(path) is None:
+        return {"error": "Unsupported file type. Use .csv or .jsonl."}
+
+    try:
+        imported, errors = Product.import_products(iter_rows(path), overwrite=overwrite)
+    except FileNotFoundError:
+        return {"error": f"File {path} not found."}
+
+    return {
+        "message": f"Imported {imported} product(s), {len(errors)} row(s) rejected.",
+        "imported": imported,
+        "errors": [{"row": row, "error": message} for row, message in errors]
+    }
+
+# Bulk export of the catalog (CSV or JSONL)
+@instrument("catalog_io.export_catalog")
+def export_catalog(path):
+    """Allow only admins to export the product catalog."""
+    if not Auth.is_admin():
+        return {"error": "Access denied. Admins only."}
+
+    output_format = file_format(path)
+    if output_format is None:
+        return {"error": "Unsupported file type. Use .csv or .jsonl."}
+
+    products = Product.load_products()
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        if output_format == "csv":
+            writer = csv.DictWriter(file, fieldnames=PRODUCT_FIELDS)
+            writer.writeheader()
+            for product in products.values():
+                writer.writerow(product.to_dict())
+        else:
+            for product in products.values():
+                file.write(json.dumps(product.to_dict()) + "\n")
+
+    return {"message": f"Exported {len(products)} product(s) to {path}."}
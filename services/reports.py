@@ -1,51 +1,113 @@
-from collections import defaultdict
 from models.transaction import Transaction
 from models.product import Product
+from models.sales_aggregates import SalesAggregates, PERIODS
+from services import analytics
 from authentication import Auth
+from storage.backend import StaleTransactionPosition
 from datetime import datetime, timedelta
+import base64
+import heapq
+import json
+from diagnostics import instrument
+
+HISTORY_PAGE_SIZE = 20  # Default transactions per history page
+RANK_FIELDS = {"units": 0, "revenue": 1}  # Position of each ranking key in an aggregate entry
+DELETED_PRODUCT_NAME = "Deleted product"  # Shown for sales of products no longer in the catalog
+NAME_LOOKUP_LIMIT = 50  # Past this many names, one catalog load beats single-product lookups
 
 def filter_transactions_by_date(days=None):
     """Filter transactions within the last 'days' days. If None, return all."""
-    transactions = transactions = Transaction.load_transactions()
     if days is None:  # No filter, return all transactions
-        return transactions
+        transactions = Transaction.load_transactions()
+        end_date = datetime.now().strftime("%Y-%m-%d")
+        start_date = min((txn.date[:10] for txn in transactions.values()), default=end_date)
+        return transactions, start_date, end_date
 
     end_date = datetime.now()
     start_date = end_date - timedelta(days=days)  # Calculate start date
 
-    filtered = {
-        tid: txn for tid, txn in transactions.items()
-        if start_date <= datetime.strptime(txn.date, "%Y-%m-%d %H:%M:%S") <= end_date
-    }
+    # Only the requested window is read from the time-indexed store
+    filtered = {txn.transaction_id: txn for txn in Transaction.iter_transactions(start_date, end_date)}
 
     return filtered, start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
 
+def _report_window(days=None):
+    """
+    Return (start_day, start_date, end_date) for an aggregate-backed report.
+
+    Aggregates are bucketed by calendar day, so the window covers whole days
+    from start_date to today. start_day is None for "all time".
+    """
+    end_date = datetime.now().strftime("%Y-%m-%d")
+    if days is None:
+        return None, SalesAggregates.first_day() or end_date, end_date
+    start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+    return start_date, start_date, end_date
+
 # Get best-selling products
 #determines the best-selling products based on the total quantity sold within the given time frame.
-def get_best_selling_products(days=None):
+@instrument("reports.get_best_selling_products")
+def get_best_selling_products(days=None, limit=None, rank_by="units", group_by="product"):
     """Allow employees and admins to get best selling products."""
     if not Auth.get_logged_in_user():
         return {"error": "Please log in to get best selling products."}
-    """Find best-selling products within the last 'days' days (default: all time)."""
-    transactions, start_date, end_date = filter_transactions_by_date(days)
+    """
+    Find best-selling products within the last 'days' days (default: all time).
+
+    - limit: Return only the top 'limit' entries (None = all). Uses a bounded heap,
+      so the top 10 of 50k products never sorts the other 49,990.
+    - rank_by: "units" or "revenue".
+    - group_by: "product" or "category".
+    """
+    error = _ranking_error(limit, rank_by, group_by)
+    if error:
+        return {"error": error}
+
+    start_day, start_date, end_date = _report_window(days)
+
+    # Units sold and revenue per product, straight from the maintained aggregates
+    if group_by == "category":
+        sales, _ = SalesAggregates.category_totals(start_day)
+    else:
+        sales, _ = SalesAggregates.product_totals(start_day)
 
-    sales_count = defaultdict(int)
+    return {"start_date": start_date, "end_date": end_date, "best_sellers": _best_sellers(sales, limit, rank_by, group_by)}
 
-    for transaction in transactions.values():
-        for i, product_id in enumerate(transaction.product_ids):
-            sales_count[product_id] += transaction.quantities[i]
+def _ranking_error(limit, rank_by, group_by):
+    """Return an error message for invalid best-seller options, or None."""
+    if rank_by not in RANK_FIELDS:
+        return "rank_by must be 'units' or 'revenue'."
+    if group_by not in ("product", "category"):
+        return "group_by must be 'product' or 'category'."
+    if limit is not None and limit <= 0:
+        return "Limit must be greater than zero."
+    return None
 
-    sorted_sales = sorted(sales_count.items(), key=lambda x: x[1], reverse=True)
+def _best_sellers(sales, limit, rank_by, group_by):
+    """Rank {product_id or category: [units, revenue]} totals into best-seller report entries."""
+    field = RANK_FIELDS[rank_by]
+    if limit is None:
+        ranked = sorted(sales.items(), key=lambda item: item[1][field], reverse=True)
+    else:
+        ranked = heapq.nlargest(limit, sales.items(), key=lambda item: item[1][field])
 
-    products = Product.load_products()
-    report = [
-        {"product_id": pid, "name": products[pid].name, "sold": count}
-        for pid, count in sorted_sales
-    ]
+    if group_by == "category":
+        return [{"category": category, "sold": units, "revenue": revenue} for category, (units, revenue) in ranked]
+    # Names are looked up only for the winners
+    names = _product_names([pid for pid, _ in ranked])
+    return [{"product_id": pid, "name": names[pid], "sold": units, "revenue": revenue} for pid, (units, revenue) in ranked]
 
-    return {"start_date": start_date, "end_date": end_date, "best_sellers": report}
+def _product_names(product_ids):
+    """Return {product_id: name}, with DELETED_PRODUCT_NAME for products no longer in the catalog."""
+    lookup = Product.load_products().get if len(product_ids) > NAME_LOOKUP_LIMIT else Product.search_by_id
+    names = {}
+    for pid in product_ids:
+        product = lookup(pid)
+        names[pid] = product.name if product else DELETED_PRODUCT_NAME
+    return names
 
 # Get total revenue from all transactions
+@instrument("reports.get_total_revenue")
 def get_total_revenue(days=None):
     """Allow only admins to get total revenue"""
     if not Auth.is_admin():
@@ -53,16 +115,14 @@ def get_total_revenue(days=None):
 
     """Calculate total revenue within the last 'days' days (default: all time)."""
     
-    transactions, start_date, end_date = filter_transactions_by_date( days)
+    start_day, start_date, end_date = _report_window(days)
 
-    total_revenue = sum(
-        sum(transaction.quantities[i] * transaction.prices[i] for i in range(len(transaction.product_ids)))
-        for transaction in transactions.values()
-    )
+    _, total_revenue = SalesAggregates.product_totals(start_day)
 
     return {"start_date": start_date, "end_date": end_date, "total_revenue": total_revenue}
 
 # Get sales history, sorted by date
+@instrument("reports.get_sales_history")
 def get_sales_history(days=None):
     """Allow admins to only."""
     if not Auth.is_admin():
@@ -78,3 +138,211 @@ def get_sales_history(days=None):
         "end_date": end_date,
         "transactions": [t.to_dict() for t in sorted_transactions]
     }
+
+def _encode_cursor(position, since_ts):
+    """Pack a history position (and the window it belongs to) into an opaque resume token."""
+    return base64.urlsafe_b64encode(json.dumps([position, since_ts]).encode()).decode()
+
+def _decode_cursor(token):
+    """Return (position, since_ts) from a resume token; raises ValueError if it is malformed."""
+    try:
+        position, since_ts = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError(token)
+    return position, since_ts
+
+# Get one page of sales history, newest first, reading only what the page needs
+@instrument("reports.get_sales_history_page")
+def get_sales_history_page(days=None, page_size=HISTORY_PAGE_SIZE, cursor=None, customer=None, product_id=None):
+    """
+    Allow admins only. Return one page of transactions, newest first.
+
+    - days: Only the last 'days' days (default: all time); fixed by the cursor once paging.
+    - page_size: Transactions per page.
+    - cursor: "next_cursor" from the previous page (None = first page).
+    - customer: Case-insensitive match on part of the customer name, or the exact phone number.
+    - product_id: Only transactions that include this product.
+
+    The result's "next_cursor" is None once the history is exhausted.
+    """
+    if not Auth.is_admin():
+        return {"error": "Access denied. Admins only."}
+    if page_size <= 0:
+        return {"error": "Page size must be greater than zero."}
+
+    if cursor is None:
+        position = None
+        since_ts = int((datetime.now() - timedelta(days=days)).timestamp()) if days is not None else None
+    else:
+        try:
+            position, since_ts = _decode_cursor(cursor)
+        except ValueError:
+            return {"error": "Invalid history cursor."}
+
+    customer_lower = customer.lower() if customer else None
+    page = []
+    next_position = None
+    try:
+        for transaction, position in Transaction.iter_history(position, since_ts):
+            if customer_lower and customer_lower not in transaction.customer_name.lower() and customer != transaction.customer_phone:
+                continue
+            if product_id and product_id not in transaction.product_ids:
+                continue
+            total_price = sum(quantity * price for quantity, price in zip(transaction.quantities, transaction.prices))
+            page.append(dict(transaction.to_dict(), total_price=total_price))
+            if len(page) == page_size:
+                next_position = position
+                break
+    except StaleTransactionPosition:
+        return {"error": "Sales history was rewritten. Please start again from the first page."}
+
+    return {
+        "start_date": datetime.fromtimestamp(since_ts).strftime("%Y-%m-%d") if since_ts is not None else "Beginning",
+        "end_date": datetime.now().strftime("%Y-%m-%d"),
+        "transactions": page,
+        "next_cursor": _encode_cursor(next_position, since_ts) if next_position is not None else None
+    }
+
+# Recompute the sales aggregates from the raw transaction history
+@instrument("reports.rebuild_sales_aggregates")
+def rebuild_sales_aggregates():
+    """Allow only admins to rebuild the aggregates."""
+    if not Auth.is_admin():
+        return {"error": "Access denied. Admins only."}
+
+    if analytics.is_available():
+        # Vectorized grouping over the whole history
+        state = SalesAggregates.replace(analytics.build_sales_aggregates())
+    else:
+        state = SalesAggregates.rebuild()
+    return {"message": f"Sales aggregates rebuilt. Total revenue: {state['total_revenue']:.2f}"}
+
+# Revenue and best sellers over an arbitrary date range, straight from the raw history
+@instrument("reports.get_sales_analysis")
+def get_sales_analysis(start_date=None, end_date=None, limit=None):
+    """
+    Allow only admins to analyse sales between two dates.
+
+    - start_date / end_date: datetimes (either can be None for an open range);
+      the end date is inclusive, so its whole day counts.
+    - limit: Number of best sellers to return (None = all).
+
+    Uses the columnar NumPy engine when it is installed.
+    """
+    if not Auth.is_admin():
+        return {"error": "Access denied. Admins only."}
+    error = _ranking_error(limit, "units", "product")
+    if error:
+        return {"error": error}
+
+    if end_date:
+        end_date = end_date.replace(hour=23, minute=59, second=59)  # Include the whole end day
+    start_ts = int(start_date.timestamp()) if start_date else None
+    end_ts = int(end_date.timestamp()) if end_date else None
+
+    if analytics.is_available():
+        columns = analytics.SalesColumns.load(start_ts, end_ts)
+        total_revenue = columns.total_revenue()
+        ranked = columns.top_products(limit)
+    else:
+        totals = {}
+        total_revenue = 0
+        for transaction in Transaction.iter_transactions(start_date, end_date):
+            for product_id, quantity, price in zip(transaction.product_ids, transaction.quantities, transaction.prices):
+                entry = totals.setdefault(product_id, [0, 0])
+                entry[0] += quantity
+                entry[1] += quantity * price
+                total_revenue += quantity * price
+        ranked = sorted(((pid, units, revenue) for pid, (units, revenue) in totals.items()), key=lambda x: x[1], reverse=True)
+        ranked = ranked[:limit] if limit is not None else ranked
+
+    names = _product_names([pid for pid, _, _ in ranked])
+    return {
+        "start_date": start_date.strftime("%Y-%m-%d") if start_date else "Beginning",
+        "end_date": (end_date or datetime.now()).strftime("%Y-%m-%d"),
+        "total_revenue": total_revenue,
+        "best_sellers": [
+            {"product_id": pid, "name": names[pid], "sold": units, "revenue": revenue}
+            for pid, units, revenue in ranked
+        ]
+    }
+
+def _calendar_range(start_date=None, end_date=None):
+    """
+    Return (start_day, end_day) "YYYY-MM-DD" strings for a calendar range of datetimes/dates.
+
+    A missing start is the first day with sales (today if there are none), a missing end is today.
+    """
+    end_day = (end_date or datetime.now()).strftime("%Y-%m-%d")
+    start_day = start_date.strftime("%Y-%m-%d") if start_date else min(SalesAggregates.first_day() or end_day, end_day)
+    return start_day, end_day
+
+# Units and revenue per day or ISO week over a calendar range, from the period rollups
+@instrument("reports.get_sales_trend")
+def get_sales_trend(start_date=None, end_date=None, period="week", product_id=None, category=None):
+    """
+    Allow only admins to view a sales trend.
+
+    - start_date / end_date: datetimes or dates, inclusive (default: first sale to today).
+    - period: "day" or "week" (ISO weeks, Monday to Sunday; edge weeks count whole).
+    - product_id / category: Trend of one product or one category (default: the whole store).
+    """
+    if not Auth.is_admin():
+        return {"error": "Access denied. Admins only."}
+    if period not in PERIODS:
+        return {"error": "period must be 'day' or 'week'."}
+    if product_id is not None and category is not None:
+        return {"error": "Choose either a product or a category, not both."}
+
+    start_day, end_day = _calendar_range(start_date, end_date)
+    if start_day > end_day:
+        return {"error": "Start date must not be after the end date."}
+
+    series = SalesAggregates.period_series(start_day, end_day, period, product_id=product_id, category=category)
+    return {
+        "start_date": start_day,
+        "end_date": end_day,
+        "period": period,
+        "product_id": product_id,
+        "category": category,
+        "periods": [
+            {"period": key, "start_date": first_day, "sold": units, "revenue": revenue}
+            for key, first_day, units, revenue in series
+        ]
+    }
+
+# Revenue and best sellers over a calendar range, from the period rollups
+@instrument("reports.get_period_report")
+def get_period_report(start_date=None, end_date=None, group_by="product", rank_by="units", limit=None):
+    """
+    Allow only admins to get a sales report for a calendar range.
+
+    - start_date / end_date: datetimes or dates, inclusive (default: first sale to today).
+    - group_by: "product" or "category"; rank_by: "units" or "revenue".
+    - limit: Return only the top 'limit' entries (None = all).
+
+    Whole weeks of the range are read from the weekly rollups, so a report
+    over a year reads about 52 buckets rather than every sale.
+    """
+    if not Auth.is_admin():
+        return {"error": "Access denied. Admins only."}
+    error = _ranking_error(limit, rank_by, group_by)
+    if error:
+        return {"error": error}
+
+    start_day, end_day = _calendar_range(start_date, end_date)
+    if start_day > end_day:
+        return {"error": "Start date must not be after the end date."}
+
+    if group_by == "category":
+        sales, total_revenue = SalesAggregates.category_totals(start_day, end_day)
+    else:
+        sales, total_revenue = SalesAggregates.product_totals(start_day, end_day)
+
+    return {
+        "start_date": start_day,
+        "end_date": end_day,
+        "total_revenue": total_revenue,
+        "total_sold": sum(units for units, _ in sales.values()),
+        "best_sellers": _best_sellers(sales, limit, rank_by, group_by)
+    }
@@ -1,73 +1,218 @@
-from datetime import datetime
+import hashlib
+import os
+import re
+import socket
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
 from models.product import Product
 from models.transaction import Transaction
+from models.sales_aggregates import SalesAggregates
 from authentication import Auth
+from services.catalog_io import file_format, iter_rows
+from diagnostics import instrument
+
+# Transaction IDs: <UTC time to the ms>-<sequence>-<node>[_<initials>], e.g. 251018171905123-000-3fa2c1_SR
+# The node tells processes apart (STOCK_MASTER_NODE_ID, else a hash of host and pid),
+# the sequence tells apart IDs issued by one process within the same millisecond.
+NODE_ID = re.sub(r"[^0-9A-Za-z]", "", os.environ.get("STOCK_MASTER_NODE_ID", ""))[:12]
+MAX_SEQUENCE = 0xFFF  # IDs per process per millisecond before borrowing the next millisecond
+
+_id_lock = threading.Lock()
+_id_state = {"pid": None, "node": None, "ms": 0, "sequence": 0, "stamp_second": None, "stamp": ""}
+
+def _node_id():
+    # Recomputed after a fork, so child processes never share the parent's node
+    if _id_state["pid"] != os.getpid():
+        _id_state["pid"] = os.getpid()
+        _id_state["node"] = NODE_ID or hashlib.blake2b(f"{socket.gethostname()}:{os.getpid()}".encode(), digest_size=3).hexdigest()
+        _id_state["ms"] = _id_state["sequence"] = 0
+    return _id_state["node"]
 
 def generate_transaction_id(customer_name):
-    """Generate a unique transaction ID based on date and customer initials."""
-    timestamp = datetime.now().strftime("%y%m%d%H%M")  # YYMMDDHHMM
+    """
+    Generate a unique transaction ID without any shared lookup.
+
+    IDs from one process strictly increase (even if the clock steps back) and
+    sort by time across processes, so sorting by ID is sorting by sale time.
+    """
     initials = "".join([word[0] for word in customer_name.split()]).upper()  # Extract initials
-    return f"{timestamp}_{initials}"  # Format: 2502281445_A
+    with _id_lock:
+        node = _node_id()
+        ms = max(time.time_ns() // 1_000_000, _id_state["ms"])
+        if ms == _id_state["ms"]:
+            _id_state["sequence"] += 1
+            if _id_state["sequence"] > MAX_SEQUENCE:
+                ms, _id_state["sequence"] = ms + 1, 0
+        else:
+            _id_state["sequence"] = 0
+        _id_state["ms"] = ms
+        sequence = _id_state["sequence"]
 
-def sell_products(product_details, customer_name, customer_phone):
-    """Allow employees and admins to sell products."""
-    if not Auth.get_logged_in_user():
-        return {"error": "Please log in to sell a product."}
-    
+        second, millisecond = divmod(ms, 1000)
+        if second != _id_state["stamp_second"]:
+            _id_state["stamp_second"] = second
+            _id_state["stamp"] = datetime.fromtimestamp(second, timezone.utc).strftime("%y%m%d%H%M%S")
+        stamp = _id_state["stamp"]
+    transaction_id = f"{stamp}{millisecond:03d}-{sequence:03x}-{node}"
+    return f"{transaction_id}_{initials}" if initials else transaction_id  # Format: 251018171905123-000-3fa2c1_SR
+
+#Checks a basket against the catalog and builds its transaction
+def _prepare_sale(products, product_details, customer_name, customer_phone, date=None):
     """
-    Sell multiple products, decrease stock, and record transaction.
-    
-    product_details: List of tuples [(product_id, quantity), ...]
-    customer_name: str
-    customer_phone: str
+    Return (transaction, stock changes, result) for a basket, or (None, None, error message).
+
+    Stock is checked against products only; the final check happens when the
+    stock changes are applied. date: when the sale happened ("YYYY-MM-DD HH:MM:SS");
+    None dates it when it is recorded.
     """
     if not product_details:
-        return {"error": "No products selected for sale."}
+        return None, None, "No products selected for sale."
 
-    products = Product.load_products()
     product_ids = []
     quantities = []
     prices = []
+    requested = defaultdict(int)  # Total quantity per product across the basket
 
-    # Check stock availability
+    # Check stock availability for the whole basket
     for product_id, quantity in product_details:
         if product_id not in products:
-            return {"error": f"Product {product_id} not found."}
-        
+            return None, None, f"Product {product_id} not found."
+
         product = products[product_id]
 
         if quantity <= 0:
-            return {"error": f"Invalid quantity for {product.name}."}
-        
-        if product.quantity < quantity:
-            return {"error": f"Not enough stock for {product.name}."}
+            return None, None, f"Invalid quantity for {product.name}."
+
+        requested[product_id] += quantity
+        if product.quantity < requested[product_id]:
+            return None, None, f"Not enough stock for {product.name}."
 
         product_ids.append(product_id)
         quantities.append(quantity)
         prices.append(product.price)
 
-    # Deduct stock
-    for i, product_id in enumerate(product_ids):
-        new_quantity = products[product_id].quantity - quantities[i]
-        Product.update_product(product_id, quantity=new_quantity)
-
     # Generate transaction ID dynamically
     transaction_id = generate_transaction_id(customer_name)
 
     # Create transaction
-    transaction = Transaction(transaction_id, product_ids, quantities, prices, customer_name, customer_phone)
-
-    transactions = Transaction.load_transactions()
-    transactions[transaction_id] = transaction.to_dict()
-
-    # Save transaction
-    Transaction.save_transactions(transactions)
+    transaction = Transaction(transaction_id, product_ids, quantities, prices, customer_name, customer_phone, date)
 
     total_price = sum(quantities[i] * prices[i] for i in range(len(product_ids)))
-
-    return {
+    result = {
         "message": "Transaction successful!",
         "transaction_id": transaction_id,
         "total_price": total_price,
         "sold_items": [{"product_id": pid, "quantity": quantities[i], "price": prices[i]} for i, pid in enumerate(product_ids)]
     }
+    return transaction, {pid: -qty for pid, qty in requested.items()}, result
+
+@instrument("sales.sell_products")
+def sell_products(product_details, customer_name, customer_phone):
+    """Allow employees and admins to sell products."""
+    if not Auth.get_logged_in_user():
+        return {"error": "Please log in to sell a product."}
+    
+    """
+    Sell multiple products, decrease stock, and record transaction.
+    
+    product_details: List of tuples [(product_id, quantity), ...]
+    customer_name: str
+    customer_phone: str
+    """
+    transaction, changes, result = _prepare_sale(Product.load_products(), product_details, customer_name, customer_phone)
+    if transaction is None:
+        return {"error": result}
+
+    # Deduct stock for every line and record the transaction in one stock-log write
+    success, error = Product.adjust_stock(changes, transaction=transaction)
+    if not success:
+        return {"error": error}
+
+    # Fold the new sale into the report aggregates
+    SalesAggregates.refresh()
+
+    return result
+
+#Reads a quantity from JSON input without rounding it (2.9, true and "2.0" are rejected)
+def parse_quantity(value):
+    """Return value as an int if it is one (or a string of one); raises ValueError otherwise."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and re.fullmatch(r"[+-]?\d+", value):
+        return int(value)
+    raise ValueError(f"Invalid quantity: {value!r}")
+
+#Reads one queued order ({"products": [[product_id, quantity], ...], "customer_name", "customer_phone", optional "date"})
+def _parse_order(order):
+    """Return (product_details, customer_name, customer_phone, date or None); raises ValueError if malformed."""
+    try:
+        product_details = [(str(product_id), parse_quantity(quantity)) for product_id, quantity in order["products"]]
+        date = order.get("date")
+        if date is not None:
+            date = datetime.strptime(date, "%Y-%m-%d %H:%M:%S").strftime("%Y-%m-%d %H:%M:%S")
+        return product_details, str(order["customer_name"]), str(order["customer_phone"]), date
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Order must contain 'products' ([[product_id, quantity], ...]), 'customer_name' and 'customer_phone'"
+                         " (and optionally 'date' as YYYY-MM-DD HH:MM:SS).")
+
+# Replays many orders (e.g. a till's offline queue) with one stock write
+@instrument("sales.sell_products_batch")
+def sell_products_batch(orders):
+    """
+    Allow employees and admins to sell a list of orders in one go.
+
+    - orders: Iterable of order dicts, processed in order: {"products": [[product_id, quantity], ...],
+      "customer_name": str, "customer_phone": str}. An optional "date" ("YYYY-MM-DD HH:MM:SS",
+      when a till queued the sale) is kept as the sale's time; without one the sale is dated now.
+
+    Each order is accepted or rejected on its own, against the stock left by
+    the orders accepted before it. The catalog is read once, every accepted
+    sale is persisted in one stock-log write, and the report aggregates are
+    refreshed once.
+    """
+    if not Auth.get_logged_in_user():
+        return {"error": "Please log in to sell products."}
+
+    products = Product.load_products()
+    results = []
+    sales = []  # (index into results, transaction, stock changes)
+    for order in orders:
+        try:
+            transaction, changes, result = _prepare_sale(products, *_parse_order(order))
+        except ValueError as error:
+            transaction, result = None, str(error)
+        if transaction is None:
+            results.append({"order": len(results) + 1, "error": result})
+            continue
+        sales.append((len(results), transaction, changes))
+        results.append({"order": len(results) + 1, **result})
+
+    outcomes = Product.apply_stock_changes([(changes, transaction) for _, transaction, changes in sales])
+    for (index, _, _), (success, error) in zip(sales, outcomes):
+        if not success:
+            results[index] = {"order": index + 1, "error": error}
+
+    accepted = sum(1 for result in results if "error" not in result)
+    if accepted:
+        # Fold the new sales into the report aggregates
+        SalesAggregates.refresh()
+
+    return {
+        "message": f"Processed {len(results)} order(s): {accepted} accepted, {len(results) - accepted} rejected.",
+        "accepted": accepted,
+        "rejected": len(results) - accepted,
+        "results": results
+    }
+
+# Replays a queue file of orders (JSONL, one order per line)
+def sell_orders_file(path):
+    """Sell every order in a .jsonl file with sell_products_batch."""
+    if file_format(path) != "jsonl":
+        return {"error": "Unsupported file type. Use .jsonl (one order per line)."}
+    try:
+        orders = list(iter_rows(path))
+    except FileNotFoundError:
+        return {"error": f"File {path} not found."}
+    return sell_products_batch(orders)
@@ -1,41 +1,73 @@
 from models.product import Product
+from models.stock_monitor import StockMonitor
 from authentication import Auth
-def check_stock_levels(threshold=5):
+from diagnostics import instrument
+@instrument("stock.check_stock_levels")
+def check_stock_levels(threshold=None):
     #check if user is logged in
     if not Auth.get_logged_in_user():
         return {"error": "Please log in to check stock levels."}
-    """Checks stock levels and returns a list of low-stock items."""
-    products = Product.load_products()  # It returns a dict of Product objects
+    """
+    Checks stock levels and returns a list of low-stock items, lowest quantity first.
+
+    - threshold: Items with quantity below this number; None uses each
+      product's own reorder threshold.
+    """
+    with Product.catalog_lock():
+        products = Product.load_products()  # A read-only catalog store of Product objects
+        version = Product.catalog_version()
+    # Answered from the maintained low-stock index; only the matches become Product objects
+    if threshold is None:
+        low = StockMonitor.low_stock(products, version)
+    else:
+        low = [(product_id, quantity, threshold) for product_id, quantity in StockMonitor.below(products, version, threshold)]
     low_stock_items = [
-        {"product_id": product.product_id, "name": product.name, "quantity": product.quantity}
-        for product in products.values() if product.quantity < threshold
+        {"product_id": product_id, "name": products[product_id].name, "quantity": quantity, "threshold": limit}
+        for product_id, quantity, limit in low
     ]
-    
+
     return low_stock_items  # Returns a list of low-stock items
 
 
+@instrument("stock.refill_stock")
 def refill_stock(product_id, quantity):
-    """Allow employees and admins to sell products."""
+    """Allow employees and admins to refill stock."""
     if not Auth.get_logged_in_user():
         return {"error": "Please log in to refill stock."}
-    
-    """Increases stock of a specific product using update_product."""
+
+    """Increases stock of a specific product with a single stock adjustment."""
     if quantity <= 0:
         return {"error": "Quantity must be greater than zero."}
 
-    # Load products to check if the product exists
-    products = Product.load_products()
-    if product_id not in products:
+    # Applied as a delta on the freshest catalog, so a concurrent sale is never overwritten
+    success, result = Product.adjust_stock({product_id: quantity})
+
+    if success:
+        return {"message": f"Stock refilled successfully. New quantity: {result[product_id]}"}
+    else:
+        return {"error": result}
+
+
+# Per-product reorder thresholds (low stock while quantity < threshold)
+def set_reorder_threshold(product_id, threshold):
+    """Allow only admins to change a product's reorder threshold (None = default)."""
+    if not Auth.is_admin():
+        return {"error": "Access denied. Admins only."}
+    if threshold is not None and (not isinstance(threshold, int) or threshold < 0):
+        return {"error": "Threshold must be a non-negative integer."}
+
+    product = Product.search_by_id(product_id)
+    if product is None:
         return {"error": f"Product ID {product_id} not found."}
 
-    # Get the current stock and update it
-    current_quantity = products[product_id].quantity
-    new_quantity = current_quantity + quantity
+    StockMonitor.set_threshold(product_id, threshold, quantity=product.quantity)
+    return {"message": f"Reorder threshold for {product.name} set to {StockMonitor.threshold(product_id)}."}
 
-    # Use existing update_product method to update the quantity
-    success, message = Product.update_product(product_id, quantity=new_quantity)
 
-    if success:
-        return {"message": f"Stock refilled successfully. New quantity: {new_quantity}"}
-    else:
-        return {"error": message}
+def get_stock_alerts(limit=20):
+    """Return the latest low-stock / restocked events, newest first."""
+    if not Auth.get_logged_in_user():
+        return {"error": "Please log in to view stock alerts."}
+    if limit < 0:
+        return {"error": "Limit must not be negative."}
+    return StockMonitor.recent_alerts(limit)
@@ -0,0 +1,38 @@
+from models.user import User
+from services.catalog_io import file_format, iter_rows
+from authentication import Auth
+from diagnostics import instrument
+
+# Bulk user provisioning from a file (CSV or JSONL with username, password, role)
+@instrument("users.import_users")
+def import_users(path, workers=None):
+    """Allow only admins to create users in bulk."""
+    if not Auth.is_admin():
+        return {"error": "Access denied. Admins only."}
+
+    if file_format(path) is None:
+        return {"error": "Unsupported file type. Use .csv or .jsonl."}
+
+    try:
+        accounts = [
+            (str(row.get("username") or ""), str(row.get("password") or ""), str(row.get("role") or "").strip().lower())
+            for row in iter_rows(path)
+        ]
+    except FileNotFoundError:
+        return {"error": f"File {path} not found."}
+
+    added, errors = User.add_users(accounts, workers=workers)
+    return {
+        "message": f"Added {len(added)} user(s), {len(errors)} rejected.",
+        "added": added,
+        "errors": [{"username": username, "error": message} for username, message in errors]
+    }
+
+# Hash any passwords still stored in plain text
+def rehash_passwords(workers=None):
+    """Allow only admins to migrate plain-text passwords."""
+    if not Auth.is_admin():
+        return {"error": "Access denied. Admins only."}
+
+    count = User.rehash_plaintext_passwords(workers=workers)
+    return {"message": f"Passwords updated successfully. {count} rehashed."}
@@ -0,0 +1,253 @@
+import os
+from datetime import datetime
+
+# Where the data lives and which engine stores it; both can be set from the environment
+DATA_DIR = os.environ.get("STOCK_MASTER_DATA_DIR", "database")
+BACKEND_NAME = os.environ.get("STOCK_MASTER_BACKEND", "json")
+
+_backend = None  # Active backend, created lazily by get_backend()
+
+class StaleTransactionPosition(Exception):
+    """Raised when a saved transaction position belongs to a history that was since rewritten."""
+
+class WriteConflict(Exception):
+    """Raised when the catalog changed in storage after the writer read it (optimistic check)."""
+
+class StorageBackend:
+    """
+    Interface shared by every storage engine.
+
+    Models talk to the backend with plain dicts (or objects with to_dict()),
+    so nothing in models/ or services/ needs to know which engine is active.
+    Every backend has a data_dir, where side files such as logs can go.
+    """
+    name = None
+    indexed_lookups = False  # True if get_product() avoids loading the catalog
+
+    # Products
+    def products_signature(self):
+        """Return a value that changes whenever the stored catalog changes."""
+        raise NotImplementedError
+
+    def load_products(self):
+        """Return the whole catalog as {product_id: dict}."""
+        raise NotImplementedError
+
+    def get_product(self, product_id):
+        """Return one product dict, or None if it does not exist."""
+        return self.load_products().get(product_id)
+
+    def products_snapshot(self, signature=None):
+        """Return a memory-mapped catalog snapshot matching signature, or None if the backend has none."""
+        return None
+
+    def save_products(self, products, changed=None, deleted=(), expected_signature=None):
+        """
+        Persist the catalog and return its new products_signature().
+
+        - products: Full catalog {product_id: record} after the change.
+        - changed: Product IDs that were added/updated (None = everything).
+        - deleted: Product IDs that were removed.
+        - expected_signature: Signature the writer read the catalog at; if storage
+          has moved on since, nothing is written and WriteConflict is raised.
+        """
+        raise NotImplementedError
+
+    def log_stock_changes(self, records, expected_signature=None):
+        """
+        Record stock changes, each optionally with the transaction that caused it.
+
+        - records: [{"quantities": {product_id: new_quantity}, "transaction": dict or None}],
+          applied in order; a record's quantities and transaction are stored together.
+        - expected_signature: As for save_products (raises WriteConflict).
+
+        Returns (new products_signature(), ticket). The changes are visible at
+        once but only durable after flush_stock_log(ticket).
+        """
+        products = self.load_products()
+        with_transactions = []
+        for record in records:
+            for product_id, quantity in record["quantities"].items():
+                products[product_id]["quantity"] = quantity
+            if record.get("transaction"):
+                with_transactions.append(record["transaction"])
+        changed = {product_id for record in records for product_id in record["quantities"]}
+        signature = self.save_products(products, changed=changed, expected_signature=expected_signature)
+        for transaction in with_transactions:
+            self.append_transaction(transaction)
+        return signature, None
+
+    def flush_stock_log(self, ticket):
+        """Block until the changes logged with ticket are durable."""
+
+    # Transactions
+    def iter_transactions(self):
+        """Yield transaction dicts in the order they were recorded."""
+        raise NotImplementedError
+
+    def iter_transactions_between(self, start_ts=None, end_ts=None):
+        """
+        Yield transaction dicts with start_ts <= "ts" <= end_ts (epoch seconds).
+
+        Either bound may be None. Backends use their time index so only the
+        requested window is read.
+        """
+        raise NotImplementedError
+
+    def iter_transactions_since(self, position):
+        """
+        Yield (record, position_after) for transactions recorded after position.
+
+        Positions are opaque JSON-serialisable values; None means the start of
+        the history. Raises StaleTransactionPosition if the history was rewritten.
+        """
+        raise NotImplementedError
+
+    def transactions_skew(self):
+        """
+        Return the most seconds a transaction is older than one recorded before it.
+
+        0 while the history is in time order; replayed orders that keep
+        their own time can put it behind newer sales.
+        """
+        return 0
+
+    def iter_transactions_reverse(self, before=None):
+        """
+        Yield (record, cursor) newest first (reverse recording order).
+
+        Passing a yielded cursor as before resumes with the record just older
+        than that one; None starts from the newest. Records are read lazily, so
+        a caller that stops early only pays for what it consumed. Raises
+        StaleTransactionPosition if the history was rewritten since.
+        """
+        raise NotImplementedError
+
+    def transactions_position(self):
+        """Return the position just past the last recorded transaction."""
+        raise NotImplementedError
+
+    def append_transaction(self, record):
+        """Record one transaction."""
+        raise NotImplementedError
+
+    def save_transactions(self, records):
+        """Replace the whole transaction history with the given records."""
+        raise NotImplementedError
+
+    def migrate_legacy_transactions(self):
+        """Convert any legacy transaction storage; returns the number migrated."""
+        return 0
+
+    # Users
+    def users_signature(self):
+        """Return a value that changes whenever the stored users change (None = unknown, always reload)."""
+        return None
+
+    def load_users(self):
+        """Return {username: {"password": ..., "role": ...}}."""
+        raise NotImplementedError
+
+    def save_users(self, users):
+        """Replace all users."""
+        raise NotImplementedError
+
+    def put_user(self, username, data):
+        """Insert or replace a single user."""
+        self.put_users({username: data})
+
+    def put_users(self, users):
+        """Insert or replace several users ({username: data}) in one write."""
+        merged = self.load_users()
+        merged.update(users)
+        self.save_users(merged)
+
+    # Documents (derived data such as report aggregates)
+    def load_document(self, name):
+        """Return the JSON document stored under name, or None."""
+        raise NotImplementedError
+
+    def save_document(self, name, data):
+        """Store a JSON document under name, replacing any previous one."""
+        raise NotImplementedError
+
+
+def as_dict(record):
+    """Return the dict form of a record (models pass objects with to_dict())."""
+    return record.to_dict() if hasattr(record, "to_dict") else record
+
+
+def record_timestamp(record):
+    """
+    Return a transaction's time as epoch seconds.
+
+    Records carry it precomputed in "ts"; older records only have the
+    "date" string, which is parsed once here.
+    """
+    ts = record.get("ts")
+    if ts is None:
+        ts = int(datetime.strptime(record["date"], "%Y-%m-%d %H:%M:%S").timestamp())
+    return ts
+
+
+def with_timestamp(record):
+    """
+    Return the record's dict form with "ts" filled in.
+
+    A record without a date (a new sale) is dated now, and so is the model
+    object it came from. Backends call this with the data lock held, so new
+    sales reach the journal in time order.
+    """
+    data = as_dict(record)
+    if data.get("date") is None:
+        now = datetime.now()
+        data = {**data, "date": now.strftime("%Y-%m-%d %H:%M:%S"), "ts": int(now.timestamp())}
+        if hasattr(record, "date"):
+            record.date = data["date"]
+    if "ts" not in data:
+        data = {**data, "ts": record_timestamp(data)}
+    return data
+
+
+def create_backend(name=None, data_dir=None):
+    """Create a backend by name ("json" or "sqlite") rooted at data_dir."""
+    name = name or BACKEND_NAME
+    data_dir = data_dir or DATA_DIR
+
+    if name == "json":
+        from storage.json_backend import JsonBackend
+        return JsonBackend(data_dir)
+
+    if name == "sqlite":
+        from storage.json_backend import JsonBackend
+        from storage.sqlite_backend import SqliteBackend
+        db_path = os.path.join(data_dir, "stock_master.db")
+        is_new = not os.path.exists(db_path)
+        backend = SqliteBackend(db_path)
+        if is_new:
+            # First start on SQLite: bring over whatever the JSON files hold
+            copy_data(JsonBackend(data_dir), backend)
+        return backend
+
+    raise ValueError(f"Unknown storage backend: {name}")
+
+
+def get_backend():
+    """Return the active backend, creating it from the environment on first use."""
+    global _backend
+    if _backend is None:
+        _backend = create_backend()
+    return _backend
+
+
+def set_backend(backend):
+    """Make the given backend the active one (e.g. a temp directory in benchmarks)."""
+    global _backend
+    _backend = backend
+
+
+def copy_data(source, target):
+    """Copy products, transactions and users from one backend to another."""
+    target.save_products(source.load_products())
+    target.save_transactions(source.iter_transactions())
+    target.save_users(source.load_users())
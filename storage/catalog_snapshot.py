@@ -0,0 +1,209 @@
+import copy
+import mmap
+import os
+import struct
+from array import array
+from itertools import accumulate
+from storage.backend import as_dict
+from storage.locking import atomic_write
+
+# Binary catalog snapshot, written next to products.json on every catalog commit.
+# Layout (little-endian), every section starting on an 8-byte boundary:
+#   header    magic, format, row count, and the products_signature() it was
+#             written at (version, inode, mtime_ns and size of products.json)
+#   table     (offset, length) of each section, in SECTIONS order
+#   sections  fixed-width numeric columns (one entry per row), text columns as a
+#             UTF-8 heap plus start/length arrays, and the rows sorted by product ID
+# products.json stays the source of truth: a snapshot whose signature does not
+# match the current JSON file (e.g. after a hand edit) is ignored. Quantities
+# logged since products.json was written are laid over it with with_quantities().
+MAGIC = b"SMCS"
+FORMAT = 1
+HEADER = struct.Struct("<4sIIqQqq")
+ENTRY = struct.Struct("<QQ")
+MISSING = 0xFFFFFFFF  # Text length recorded for None (e.g. a product without an image)
+
+TEXT_COLUMNS = ("ids", "names", "imgs", "descriptions", "categories")
+SECTIONS = (
+    ("prices", "d"),
+    ("price_is_int", "b"),
+    ("quantities", "q"),
+    ("category_codes", "I"),
+    ("id_order", "I"),  # Rows sorted by product ID
+) + tuple(
+    (f"{column}_{part}", typecode)
+    for column in TEXT_COLUMNS
+    for part, typecode in (("data", "B"), ("starts", "Q"), ("lengths", "I"))
+)
+
+def _text_column(values):
+    """Return (data, starts, lengths) for a list of str/None; entries are newline-separated in data."""
+    texts = ["" if text is None else text for text in values]
+    data = "\n".join(texts).encode("utf-8")
+    sizes = list(map(len, texts))
+    if len(data) != sum(sizes) + max(len(texts) - 1, 0):  # Not all ASCII: byte and character counts differ
+        sizes = [len(text.encode("utf-8")) for text in texts]
+    starts = array("Q", accumulate((size + 1 for size in sizes[:-1]), initial=0) if sizes else ())
+    lengths = array("I", sizes)
+    if None in values:
+        for row, text in enumerate(values):
+            if text is None:
+                lengths[row] = MISSING
+    return data, starts, lengths
+
+def _signature_fields(signature):
+    # products_signature() is (path, version, inode, mtime_ns, size, stock log size),
+    # or (path, version, None) with no file; the snapshot covers products.json only
+    if signature is None or len(signature) < 5 or signature[2] is None:
+        return None
+    return tuple(signature[1:5])
+
+def write_snapshot(path, products, signature):
+    """Atomically write a snapshot of products ({product_id: record}) taken at signature."""
+    fields = _signature_fields(signature)
+    if fields is None:
+        return False
+
+    records = [as_dict(product) for product in products.values()]
+    ids = list(products)
+    categories = {}
+    columns = {
+        "prices": array("d", [record["price"] for record in records]),
+        "price_is_int": array("b", [isinstance(record["price"], int) for record in records]),
+        "quantities": array("q", [record["quantity"] for record in records]),
+        "category_codes": array("I", [categories.setdefault(record["category"], len(categories)) for record in records]),
+        "id_order": array("I", sorted(range(len(ids)), key=ids.__getitem__)),
+    }
+    texts = {
+        "ids": ids,
+        "names": [record["name"] for record in records],
+        "imgs": [record["img"] for record in records],
+        "descriptions": [record["description"] for record in records],
+        "categories": list(categories),
+    }
+    for column, values in texts.items():
+        columns[f"{column}_data"], columns[f"{column}_starts"], columns[f"{column}_lengths"] = _text_column(values)
+
+    def write(file):
+        offset = HEADER.size + ENTRY.size * len(SECTIONS)
+        table = []
+        for name, _ in SECTIONS:
+            offset += -offset % 8
+            size = memoryview(columns[name]).nbytes
+            table.append((offset, size))
+            offset += size
+
+        file.write(HEADER.pack(MAGIC, FORMAT, len(ids), *fields))
+        for entry in table:
+            file.write(ENTRY.pack(*entry))
+        for (name, _), (start, _) in zip(SECTIONS, table):
+            file.write(b"\0" * (start - file.tell()))
+            file.write(columns[name])
+
+    atomic_write(path, write, binary=True)
+    return True
+
+class CatalogSnapshot:
+    """
+    Read-only view of a snapshot file through mmap.
+
+    Nothing is parsed up front: columns are memoryviews into the mapping, so
+    get() touches only the pages it needs and section() hands whole columns
+    to CatalogStore.from_snapshot as one bulk copy.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise ValueError(f"{path} is truncated")
+
+        magic, version, count, *fields = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != FORMAT:
+            raise ValueError(f"{path} is not a catalog snapshot")
+        self.count = count
+        self.signature_fields = tuple(fields)
+        self.quantities = {}  # {product_id: quantity} overriding the quantities column
+
+        view = memoryview(self._map)
+        self._raw = {}       # name -> bytes view
+        self._sections = {}  # name -> view typed per SECTIONS
+        for index, (name, typecode) in enumerate(SECTIONS):
+            start, size = ENTRY.unpack_from(self._map, HEADER.size + ENTRY.size * index)
+            if start + size > len(self._map):
+                raise ValueError(f"{path} is truncated")
+            self._raw[name] = view[start:start + size]
+            self._sections[name] = self._raw[name].cast(typecode)
+
+    @classmethod
+    def open(cls, path, signature):
+        """Return the snapshot at path if it was written at signature, else None."""
+        fields = _signature_fields(signature)
+        if fields is None:
+            return None
+        try:
+            snapshot = cls(path)
+        except (OSError, ValueError, TypeError):
+            return None
+        return snapshot if snapshot.signature_fields == fields else None
+
+    def with_quantities(self, quantities):
+        """Return a view of the same mapping with quantities ({product_id: quantity}) laid over it."""
+        view = copy.copy(self)
+        view.quantities = quantities
+        return view
+
+    def __len__(self):
+        return self.count
+
+    def section(self, name):
+        """Return the raw bytes of a column as a memoryview into the mapping."""
+        return self._raw[name]
+
+    def _text(self, column, row):
+        length = self._sections[f"{column}_lengths"][row]
+        if length == MISSING:
+            return None
+        start = self._sections[f"{column}_starts"][row]
+        return bytes(self._sections[f"{column}_data"][start:start + length]).decode("utf-8")
+
+    def ids(self):
+        """Return every product ID in catalog order."""
+        ids = bytes(self._sections["ids_data"]).decode("utf-8").split("\n") if self.count else []
+        if len(ids) != self.count:  # An ID containing a newline; fall back to the offsets
+            ids = [self._text("ids", row) for row in range(self.count)]
+        return ids
+
+    def find(self, product_id):
+        """Return the row of product_id (binary search over the sorted IDs), or None."""
+        order = self._sections["id_order"]
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._text("ids", order[middle]) < product_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self._text("ids", order[low]) == product_id:
+            return order[low]
+        return None
+
+    def get(self, product_id):
+        """Return one product dict, or None if it is not in the snapshot."""
+        row = self.find(product_id)
+        if row is None:
+            return None
+        price = self._sections["prices"][row]
+        return {
+            "product_id": product_id,
+            "name": self._text("names", row),
+            "price": int(price) if self._sections["price_is_int"][row] else price,
+            "quantity": self.quantities.get(product_id, self._sections["quantities"][row]),
+            "category": self._text("categories", self._sections["category_codes"][row]),
+            "img": self._text("imgs", row),
+            "description": self._text("descriptions", row)
+        }
+
+def snapshot_path(products_file):
+    """Snapshot file that goes with a products.json path."""
+    return os.path.splitext(products_file)[0] + ".snapshot"
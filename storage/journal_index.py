@@ -0,0 +1,112 @@
+import json
+import os
+import diagnostics
+from bisect import bisect_right
+from datetime import datetime
+from storage.backend import record_timestamp
+from storage.locking import atomic_write_json
+
+class JournalDayIndex:
+    """
+    Sparse time index over the JSONL transaction journal.
+
+    For every day it stores the byte offset of that day's first record, so a
+    date-window query can seek straight to its start instead of reading the
+    whole history. The index is kept in "<journal>.idx" and extended
+    incrementally with whatever was appended since it was last refreshed.
+
+    Records are mostly in time order, but a sale can land a little behind
+    one written just before it (e.g. a queued order replayed with its own
+    time). "skew" is the furthest any record fell behind the newest one
+    before it: queries seek back and read on past their end by that much,
+    so out-of-order records are still found without a full scan.
+    """
+
+    def __init__(self, journal_path):
+        self.journal_path = journal_path
+        self.index_path = journal_path + ".idx"
+        self._state = None
+
+    @staticmethod
+    def _empty_state(journal_id):
+        return {"journal": journal_id, "indexed_size": 0, "day_starts": [], "offsets": [], "last_ts": None, "skew": 0}
+
+    @staticmethod
+    def _day_start(ts):
+        """Local midnight (epoch seconds) of the day containing ts."""
+        return int(datetime.fromtimestamp(ts).replace(hour=0, minute=0, second=0, microsecond=0).timestamp())
+
+    def _load(self):
+        try:
+            with open(self.index_path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        diagnostics.add("bytes_read", len(data))
+        diagnostics.add("json_parses")
+        try:
+            return json.loads(data)
+        except json.JSONDecodeError:
+            return None
+
+    def _save(self, state):
+        atomic_write_json(self.index_path, state)
+
+    def refresh(self):
+        """Index any records appended since the last refresh and return the index state."""
+        try:
+            stat = os.stat(self.journal_path)
+        except FileNotFoundError:
+            self._state = self._empty_state(None)
+            return self._state
+
+        state = self._state or self._load()
+        if state is None or state["journal"] != stat.st_ino or state["indexed_size"] > stat.st_size or "skew" not in state:
+            state = self._empty_state(stat.st_ino)  # New or rewritten journal, or an index without skew tracking
+
+        if state["indexed_size"] < stat.st_size:
+            with open(self.journal_path, "rb") as file:
+                file.seek(state["indexed_size"])
+                offset = start = state["indexed_size"]
+                parses = 0
+                while True:
+                    line = file.readline()
+                    if not line.endswith(b"\n"):
+                        break  # Stop before an append that is still in progress
+                    next_offset = offset + len(line)
+                    parses += 1
+                    try:
+                        ts = record_timestamp(json.loads(line))
+                    except (json.JSONDecodeError, KeyError, ValueError):
+                        offset = next_offset
+                        continue
+
+                    if state["last_ts"] is not None and ts < state["last_ts"]:
+                        state["skew"] = max(state["skew"], state["last_ts"] - ts)
+                    day = self._day_start(ts)
+                    if not state["day_starts"] or day > state["day_starts"][-1]:
+                        state["day_starts"].append(day)
+                        state["offsets"].append(offset)
+                    state["last_ts"] = ts if state["last_ts"] is None else max(ts, state["last_ts"])
+                    offset = next_offset
+                state["indexed_size"] = offset
+            diagnostics.add("bytes_read", state["indexed_size"] - start)
+            diagnostics.add("json_parses", parses)
+            self._save(state)
+
+        self._state = state
+        return state
+
+    def seek_plan(self, start_ts):
+        """
+        Return (offset, skew) for a query starting at start_ts.
+
+        offset is where reading must begin; the reader may stop at the first
+        record more than skew seconds past its end (no later record can be
+        inside the window).
+        """
+        state = self.refresh()
+        if start_ts is None:
+            return 0, state["skew"]
+        i = bisect_right(state["day_starts"], start_ts - state["skew"]) - 1
+        return (state["offsets"][i] if i >= 0 else 0), state["skew"]
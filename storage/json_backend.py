@@ -0,0 +1,540 @@
+import atexit
+import json
+import os
+import struct
+import threading
+from itertools import accumulate
+import diagnostics
+from storage.backend import StaleTransactionPosition, StorageBackend, WriteConflict, as_dict, record_timestamp, with_timestamp
+from storage.catalog_snapshot import CatalogSnapshot, snapshot_path, write_snapshot
+from storage.journal_index import JournalDayIndex
+from storage.locking import FileLock, atomic_write, atomic_write_json, bump_counter, read_counter
+from storage.wal import StockLog
+
+READ_BLOCK = 64 * 1024  # Bytes per read when scanning the journal backwards
+# Once the stock log grows past this, products.json is rewritten in the background
+CHECKPOINT_BYTES = int(os.environ.get("STOCK_MASTER_CHECKPOINT_BYTES", str(1024 * 1024)))
+
+def _load_json_file(path):
+    """Read and parse a whole JSON file (raises FileNotFoundError / JSONDecodeError)."""
+    with open(path, "rb") as file:
+        data = file.read()
+    diagnostics.add("bytes_read", len(data))
+    diagnostics.add("json_parses")
+    return json.loads(data)
+
+def _count_journal_reads(read, parses):
+    # Journal readers count locally and report once, keeping per-line cost flat
+    diagnostics.add("bytes_read", read)
+    diagnostics.add("json_parses", parses)
+
+def _complete_end(file, end):
+    """Return the offset just past the last newline before end (drops an append in progress)."""
+    position = end
+    while position > 0:
+        size = min(READ_BLOCK, position)
+        position -= size
+        file.seek(position)
+        newline = file.read(size).rfind(b"\n")
+        if newline != -1:
+            return position + newline + 1
+    return 0
+
+def _iter_lines_backwards(file, end):
+    """Yield (offset, line) for every newline-terminated line before end, last line first."""
+    position = _complete_end(file, end)
+    pending = b""  # Bytes from position up to the oldest line already yielded; ends with a newline
+    while position > 0:
+        size = min(READ_BLOCK, position)
+        position -= size
+        file.seek(position)
+        pending = file.read(size) + pending
+        lines = pending.split(b"\n")[:-1]
+        # The first piece may continue into the previous block, so keep it for the next read
+        complete = lines if position == 0 else lines[1:]
+        offset = position + len(pending)
+        for line in reversed(complete):
+            offset -= len(line) + 1
+            yield offset, line
+        pending = b"" if position == 0 else lines[0] + b"\n"
+
+class JsonBackend(StorageBackend):
+    """
+    Stores everything as JSON files in the data directory (the original format).
+
+    Every write holds an exclusive lock on "<data_dir>/.lock", so several
+    processes can share one data directory. Whole files are replaced via
+    temp file + atomic rename, and the catalog carries a version counter
+    (products.json.version) used for optimistic conflict checks. Each catalog
+    write also leaves a binary snapshot (products.snapshot) that is memory-mapped
+    for cold starts and single-product lookups.
+
+    Stock changes (sales, refills) go to a write-ahead log (stock.wal, see
+    storage/wal.py) rather than rewriting products.json each time; the log
+    is folded back into products.json by a background checkpoint, and on
+    first use after a crash.
+    """
+    name = "json"
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.products_file = os.path.join(data_dir, "products.json")
+        self.users_file = os.path.join(data_dir, "users.json")
+        self.transactions_file = os.path.join(data_dir, "transactions.json")  # Legacy dict-of-dicts file
+        self.transactions_log = os.path.join(data_dir, "transactions.jsonl")  # Append-only journal
+        self.products_version_file = self.products_file + ".version"
+        self.snapshot_file = snapshot_path(self.products_file)
+        self._snapshot = (None, None)  # (products.json signature, CatalogSnapshot or None) last opened
+        self._stock_log = StockLog(os.path.join(data_dir, "stock.wal"))
+        self._stock_log_checked = False
+        self._checkpoint_running = threading.Lock()
+        self._exit_checkpoint = False
+        self._journal_checked = False
+        self._day_index = JournalDayIndex(self.transactions_log)
+        self._lock = FileLock(os.path.join(data_dir, ".lock"))
+
+    # Products
+    def _products_identity(self):
+        """Return (inode, mtime_ns, size) of products.json, or None without one."""
+        try:
+            stat = os.stat(self.products_file)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def products_signature(self):
+        self._recover_stock_log()
+        # Version first: a writer replaces the file before bumping it, so a reader
+        # that sees the new version is guaranteed to read the new file
+        version = read_counter(self.products_version_file)
+        identity = self._products_identity()
+        if identity is None:
+            return (self.products_file, version, None)
+        # Stock log size last: it grows with every sale while products.json stays put
+        return (self.products_file, version, *identity, self._stock_log.size())
+
+    def _logged_quantities(self, signature):
+        """Quantities from the stock log that products.json (at signature) does not have yet."""
+        if signature[2] is None:
+            return {}
+        return self._stock_log.quantities(signature[2:5])
+
+    def load_products(self):
+        signature = self.products_signature()
+        try:
+            products = _load_json_file(self.products_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        if self._open_snapshot(signature) is None:
+            # First start, or products.json was edited by hand: the next cold start can use a snapshot
+            self._write_snapshot(products, signature)
+        for product_id, quantity in self._logged_quantities(signature).items():
+            if product_id in products:
+                products[product_id]["quantity"] = quantity
+        return products
+
+    def _open_snapshot(self, signature):
+        """Return the snapshot of products.json at signature (quantities as written), or None."""
+        key = signature[:5]  # The stock log part of the signature does not touch products.json
+        cached_key, snapshot = self._snapshot
+        if key != cached_key:
+            snapshot = CatalogSnapshot.open(self.snapshot_file, signature)
+            self._snapshot = (key, snapshot)
+        return snapshot
+
+    def products_snapshot(self, signature=None):
+        """Return the memory-mapped snapshot if it matches the catalog at signature (default: now)."""
+        signature = signature or self.products_signature()
+        snapshot = self._open_snapshot(signature)
+        logged = self._logged_quantities(signature)
+        if snapshot is not None and logged:
+            snapshot = snapshot.with_quantities(logged)
+        return snapshot
+
+    @property
+    def indexed_lookups(self):
+        return self.products_snapshot() is not None
+
+    def get_product(self, product_id):
+        snapshot = self.products_snapshot()
+        if snapshot is None:
+            return super().get_product(product_id)
+        return snapshot.get(product_id)
+
+    def save_products(self, products, changed=None, deleted=(), expected_signature=None):
+        with self._lock:
+            if expected_signature is not None and self.products_signature() != expected_signature:
+                raise WriteConflict(self.products_file)
+            return self._write_products(products)
+
+    def _write_products(self, products):
+        """Rewrite products.json (and the snapshot) from products; retires the stock log. Hold the lock."""
+        # The log's transactions must be in the journal before the new file retires the log
+        self._reconcile_logged_transactions()
+        # A JSON file can only be rewritten as a whole
+        atomic_write_json(self.products_file, {pid: as_dict(prod) for pid, prod in products.items()}, indent=4)
+        bump_counter(self.products_version_file)
+        self._stock_log.reset()
+        signature = self.products_signature()
+        self._write_snapshot(products, signature)
+        return signature
+
+    def _write_snapshot(self, products, signature):
+        """Write the binary snapshot of products, if the catalog is still at signature."""
+        with self._lock:
+            if self.products_signature() != signature:
+                return
+            try:
+                write_snapshot(self.snapshot_file, products, signature)
+                self._snapshot = (None, None)  # Reopen on next use
+            except (KeyError, TypeError, ValueError, OverflowError, struct.error, OSError):
+                pass  # The snapshot is only a cache; without a matching one readers use the JSON
+
+    # Stock log
+    def log_stock_changes(self, records, expected_signature=None):
+        with self._lock:
+            if expected_signature is not None and self.products_signature() != expected_signature:
+                raise WriteConflict(self.products_file)
+            identity = self._products_identity()
+            if identity is None:
+                raise WriteConflict(self.products_file)  # Nothing to log against; the caller reloads
+            if not self._stock_log.matches(identity):
+                # Left behind by a hand edit of products.json: keep its sales before it is cleared
+                self._reconcile_logged_transactions()
+
+            transactions = [with_timestamp(record["transaction"]) for record in records if record.get("transaction")]
+            journal_data, positions = self._journal_data(transactions)
+            logged = iter(zip(transactions, positions))
+            entries = []
+            for record in records:
+                # "journal": where the sale's journal line ends, so recovery can tell whether it made it
+                transaction, position = next(logged) if record.get("transaction") else (None, None)
+                entries.append({"quantities": record["quantities"], "transaction": transaction, "journal": position})
+            ticket = self._stock_log.append(identity, entries)
+            # Visible to readers at once; the stock log fsync makes the sales durable
+            self._write_journal_data(journal_data, sync=False)
+            signature = self.products_signature()
+        if not self._exit_checkpoint:
+            self._exit_checkpoint = True
+            atexit.register(self.checkpoint)  # Leave an up-to-date products.json behind on a clean exit
+        if signature[-1] >= CHECKPOINT_BYTES:
+            self._start_checkpoint()
+        return signature, ticket
+
+    def flush_stock_log(self, ticket):
+        self._stock_log.sync(ticket)  # Shares one fsync with every sale logged meanwhile
+
+    def _start_checkpoint(self):
+        if not self._checkpoint_running.acquire(blocking=False):
+            return  # One is already on its way
+
+        def run():
+            try:
+                self.checkpoint()
+            finally:
+                self._checkpoint_running.release()
+        threading.Thread(target=run, name="stock-log-checkpoint", daemon=True).start()
+
+    def checkpoint(self):
+        """Fold the stock log into products.json and empty it."""
+        if not self._stock_log.size():
+            return  # Nothing logged (or the data directory is gone, e.g. a benchmark's temp dir)
+        with self._lock:
+            identity = self._products_identity()
+            header, records = self._stock_log.read()
+            if not records:
+                if header is not None:
+                    self._stock_log.reset()
+                return
+            if identity is None or header != list(identity):
+                # products.json was replaced since; only the transactions still matter
+                self._reconcile_logged_transactions()
+                self._stock_log.reset()
+                return
+            self._write_products(self.load_products())
+
+    def _recover_stock_log(self):
+        """
+        Recover sales that a stopped process logged but never put in the journal
+        (once per backend). Their quantities need no work: every catalog read
+        replays the log until the next checkpoint folds it into products.json.
+        """
+        if self._stock_log_checked:
+            return
+        self._stock_log_checked = True
+        if self._stock_log.size():
+            with self._lock:
+                self._reconcile_logged_transactions()
+
+    def _reconcile_logged_transactions(self):
+        """Append logged transactions whose journal line never got written, and make the journal durable. Hold the lock."""
+        _, records = self._stock_log.read()
+        if not records:
+            return
+        self._ensure_journal()
+        journal_id = self._journal_id()
+        try:
+            size = os.stat(self.transactions_log).st_size
+        except FileNotFoundError:
+            size = 0
+        # Journal lines are written in log order, so the missing ones are the newest
+        missing = [
+            record["transaction"] for record in records
+            if record.get("transaction") and record["journal"][0] == journal_id and record["journal"][1] > size
+        ]
+        self._append_journal(missing, sync=True)
+
+    # Transactions
+    def migrate_legacy_transactions(self):
+        """
+        Convert the legacy dict-of-dicts transactions.json into the JSONL journal.
+
+        Runs only when the journal does not exist yet; the legacy file is kept
+        as transactions.json.migrated so the migration never runs twice.
+        """
+        if os.path.exists(self.transactions_log) or not os.path.exists(self.transactions_file):
+            return 0
+
+        with self._lock:
+            if os.path.exists(self.transactions_log):
+                return 0  # Another process migrated it first
+            return self._migrate_legacy_file()
+
+    def _migrate_legacy_file(self):
+        try:
+            data = _load_json_file(self.transactions_file)
+        except json.JSONDecodeError:
+            data = {}
+
+        # Journal records are kept in time order so date queries can seek into it
+        records = sorted(({"transaction_id": tid, **tdata} for tid, tdata in data.items()), key=record_timestamp)
+
+        # Written via temp file + rename so a crash can't leave a half-migrated journal
+        self._write_journal(records)
+        os.replace(self.transactions_file, self.transactions_file + ".migrated")
+
+        return len(data)
+
+    def _ensure_journal(self):
+        """Migrate the legacy file on first use of the journal."""
+        if not self._journal_checked:
+            self.migrate_legacy_transactions()
+            self._journal_checked = True
+
+    def _write_journal(self, records):
+        def write(file):
+            for record in records:
+                file.write(json.dumps(with_timestamp(record)) + "\n")
+        atomic_write(self.transactions_log, write)
+
+    def iter_transactions(self):
+        self._ensure_journal()
+        read = parses = 0
+        try:
+            with open(self.transactions_log, "rb") as file:
+                for line in file:
+                    read += len(line)
+                    if not line.strip():
+                        continue
+                    parses += 1
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Torn last line after a crash mid-append
+        except FileNotFoundError:
+            return
+        finally:
+            _count_journal_reads(read, parses)
+
+    def iter_transactions_between(self, start_ts=None, end_ts=None):
+        self._ensure_journal()
+        offset, skew = self._day_index.seek_plan(start_ts)
+        read = parses = 0
+        try:
+            with open(self.transactions_log, "rb") as file:
+                file.seek(offset)
+                for line in file:
+                    read += len(line)
+                    if not line.strip():
+                        continue
+                    parses += 1
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    ts = record_timestamp(record)  # Numeric compare, no strptime for indexed records
+                    if start_ts is not None and ts < start_ts:
+                        continue
+                    if end_ts is not None and ts > end_ts:
+                        if ts > end_ts + skew:
+                            return  # Records fall at most skew behind; nothing later is in the window
+                        continue
+                    yield record
+        except FileNotFoundError:
+            return
+        finally:
+            _count_journal_reads(read, parses)
+
+    def transactions_skew(self):
+        self._ensure_journal()
+        return self._day_index.refresh()["skew"]
+
+    def _journal_id(self):
+        # Rewrites replace the file, so its inode tells histories apart
+        try:
+            return os.stat(self.transactions_log).st_ino
+        except FileNotFoundError:
+            return None
+
+    def transactions_position(self):
+        self._ensure_journal()
+        try:
+            stat = os.stat(self.transactions_log)
+        except FileNotFoundError:
+            return [None, 0]
+        return [stat.st_ino, stat.st_size]
+
+    def iter_transactions_since(self, position):
+        self._ensure_journal()
+        journal_id = self._journal_id()
+        if position is None:
+            position = [journal_id, 0]
+        elif position[0] != journal_id and position[1] > 0:
+            raise StaleTransactionPosition(self.transactions_log)
+        if journal_id is None:
+            return
+
+        read = parses = 0
+        with open(self.transactions_log, "rb") as file:
+            if position[1] > os.fstat(file.fileno()).st_size:
+                raise StaleTransactionPosition(self.transactions_log)
+            file.seek(position[1])
+            try:
+                while True:
+                    line = file.readline()
+                    if not line.endswith(b"\n"):
+                        return  # End of file, or an append still in progress
+                    read += len(line)
+                    offset = file.tell()
+                    if not line.strip():
+                        continue
+                    parses += 1
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    yield record, [journal_id, offset]
+            finally:
+                _count_journal_reads(read, parses)
+
+    def iter_transactions_reverse(self, before=None):
+        self._ensure_journal()
+        journal_id = self._journal_id()
+        if before is not None and before[0] != journal_id:
+            raise StaleTransactionPosition(self.transactions_log)
+        if journal_id is None:
+            return
+
+        with open(self.transactions_log, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            end = size if before is None else before[1]
+            if end > size:
+                raise StaleTransactionPosition(self.transactions_log)
+            read = parses = 0
+            try:
+                for offset, line in _iter_lines_backwards(file, end):
+                    read += len(line) + 1
+                    if not line.strip():
+                        continue
+                    parses += 1
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    yield record, [journal_id, offset]
+            finally:
+                _count_journal_reads(read, parses)
+
+    def append_transaction(self, record):
+        self._ensure_journal()
+        with self._lock:
+            self._append_journal([record], sync=True)
+
+    def _append_journal(self, records, sync):
+        """Append records to the journal (sync: fsync it, even if records is empty). Hold the lock."""
+        self._write_journal_data(self._journal_data(records)[0], sync)
+
+    def _journal_data(self, records):
+        """
+        Return (bytes, positions) that append records to the journal; hold the lock until written.
+
+        positions[i] is [journal inode, journal size once record i is written].
+        """
+        self._ensure_journal()
+        lines = [(json.dumps(with_timestamp(record)) + "\n").encode() for record in records]
+        fd = os.open(self.transactions_log, os.O_RDONLY | os.O_CREAT, 0o644)
+        try:
+            stat = os.fstat(fd)
+            # Terminate a line torn by an earlier crash so these records stay readable
+            torn = lines and stat.st_size and os.pread(fd, 1, stat.st_size - 1) != b"\n"
+        finally:
+            os.close(fd)
+        data = (b"\n" if torn else b"") + b"".join(lines)
+        ends = accumulate(map(len, lines), initial=stat.st_size + (1 if torn else 0))
+        next(ends)
+        return data, [[stat.st_ino, end] for end in ends]
+
+    def _write_journal_data(self, data, sync):
+        fd = os.open(self.transactions_log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            if data:
+                os.write(fd, data)
+                diagnostics.add("bytes_written", len(data))
+            if sync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def save_transactions(self, records):
+        self._ensure_journal()
+        with self._lock:
+            self._write_journal(records)
+
+    # Users
+    def users_signature(self):
+        try:
+            stat = os.stat(self.users_file)
+        except FileNotFoundError:
+            return (self.users_file, None)
+        return (self.users_file, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    def load_users(self):
+        try:
+            return _load_json_file(self.users_file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save_users(self, users):
+        with self._lock:
+            atomic_write_json(self.users_file, users, indent=4)
+
+    def put_users(self, users):
+        # Read-modify-write under the lock so concurrent additions don't overwrite each other
+        with self._lock:
+            merged = self.load_users()
+            merged.update(users)
+            atomic_write_json(self.users_file, merged, indent=4)
+
+    # Documents
+    def _document_file(self, name):
+        return os.path.join(self.data_dir, f"{name}.json")
+
+    def load_document(self, name):
+        try:
+            return _load_json_file(self._document_file(name))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def save_document(self, name, data):
+        with self._lock:
+            atomic_write_json(self._document_file(name), data)
@@ -0,0 +1,115 @@
+import json
+import os
+import stat
+import tempfile
+import threading
+import diagnostics
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows: fall back to in-process locking only
+    fcntl = None
+
+class FileLock:
+    """
+    Exclusive advisory lock (fcntl.flock) on a lock file, shared by every process
+    using the same data directory.
+
+    Re-entrant within a process: nested `with lock:` blocks in the same thread
+    only take the OS lock once.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._thread_lock.release()
+
+
+def _fsync_directory(directory):
+    """Make a rename durable (no-op where directories can't be opened)."""
+    try:
+        fd = os.open(directory or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+# The process umask, read once at import (os.umask can only be read by setting it)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _file_mode(path):
+    """Permission bits a rewrite of path should keep: its current mode, or what open() would create."""
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
+
+
+def atomic_write(path, write, binary=False):
+    """
+    Replace path atomically: write(file) fills a temp file in the same directory,
+    which is fsynced and renamed over path. A crash leaves either the old or the
+    new file, never a truncated one. binary=True opens the temp file in "wb" mode.
+    """
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with (os.fdopen(fd, "wb") if binary else os.fdopen(fd, "w", newline="")) as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+            diagnostics.add("bytes_written", file.tell())
+        os.chmod(temp_path, _file_mode(path))  # mkstemp creates 0600; keep the file readable by other tills
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    _fsync_directory(directory)
+
+
+def atomic_write_json(path, data, indent=None):
+    """Atomically replace path with data serialised as JSON."""
+    atomic_write(path, lambda file: json.dump(data, file, indent=indent))
+
+
+def read_counter(path):
+    """Read an integer counter file (0 if missing or unreadable)."""
+    try:
+        with open(path, "r") as file:
+            return int(file.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def bump_counter(path):
+    """Increment an integer counter file atomically; call with the data lock held."""
+    value = read_counter(path) + 1
+    atomic_write(path, lambda file: file.write(str(value)))
+    return value
@@ -0,0 +1,317 @@
+import json
+import os
+import sqlite3
+import threading
+from storage.backend import StaleTransactionPosition, StorageBackend, WriteConflict, as_dict, with_timestamp
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('products_version', 0);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('transactions_epoch', 0);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('users_version', 0);
+
+CREATE TABLE IF NOT EXISTS products (
+    product_id  TEXT PRIMARY KEY,
+    name        TEXT NOT NULL,
+    price       NUMERIC NOT NULL,
+    quantity    INTEGER NOT NULL,
+    category    TEXT NOT NULL,
+    img         TEXT NOT NULL,
+    description TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_products_category ON products (category);
+CREATE INDEX IF NOT EXISTS idx_products_price ON products (price);
+CREATE INDEX IF NOT EXISTS idx_products_quantity ON products (quantity);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    seq            INTEGER PRIMARY KEY AUTOINCREMENT,
+    transaction_id TEXT NOT NULL,
+    customer_name  TEXT NOT NULL,
+    customer_phone TEXT NOT NULL,
+    product_ids    TEXT NOT NULL,  -- JSON list
+    quantities     TEXT NOT NULL,  -- JSON list
+    prices         TEXT NOT NULL,  -- JSON list
+    date           TEXT NOT NULL,
+    ts             INTEGER         -- date as epoch seconds, for range queries
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_id ON transactions (transaction_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions (date);
+
+CREATE TABLE IF NOT EXISTS documents (
+    name TEXT PRIMARY KEY,
+    body TEXT NOT NULL  -- JSON
+);
+
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL,
+    role     TEXT NOT NULL
+);
+"""
+
+PRODUCT_COLUMNS = ("product_id", "name", "price", "quantity", "category", "img", "description")
+UPSERT_PRODUCT = (
+    "INSERT INTO products (product_id, name, price, quantity, category, img, description) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (product_id) DO UPDATE SET name = excluded.name, price = excluded.price, "
+    "quantity = excluded.quantity, category = excluded.category, img = excluded.img, "
+    "description = excluded.description"
+)
+INSERT_TRANSACTION = (
+    "INSERT INTO transactions (transaction_id, customer_name, customer_phone, product_ids, quantities, prices, date, ts) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+TRANSACTION_COLUMNS = "transaction_id, customer_name, customer_phone, product_ids, quantities, prices, date, ts"
+BUMP_PRODUCTS_VERSION = "UPDATE meta SET value = value + 1 WHERE key = 'products_version'"
+BUMP_USERS_VERSION = "UPDATE meta SET value = value + 1 WHERE key = 'users_version'"
+
+class SqliteBackend(StorageBackend):
+    """
+    Stores everything in a single SQLite database (stdlib sqlite3, WAL mode).
+
+    Every statement is parameterised with a fixed SQL string, so sqlite3's
+    statement cache reuses the prepared statements across calls.
+    """
+    name = "sqlite"
+    indexed_lookups = True
+
+    def __init__(self, path):
+        self.path = path
+        self.data_dir = os.path.dirname(path) or "."
+        self._local = threading.local()  # One connection per thread
+        self._skew = (None, 0, None, 0)  # (transactions epoch, last seq, newest ts, skew) for transactions_skew()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+            self._migrate_timestamps(conn)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_ts ON transactions (ts)")
+
+    @staticmethod
+    def _migrate_timestamps(conn):
+        """Add and backfill the ts column on databases created before it existed."""
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(transactions)")]
+        if "ts" not in columns:
+            conn.execute("ALTER TABLE transactions ADD COLUMN ts INTEGER")
+        rows = conn.execute("SELECT seq, date FROM transactions WHERE ts IS NULL").fetchall()
+        conn.executemany(
+            "UPDATE transactions SET ts = ? WHERE seq = ?",
+            ((with_timestamp({"date": date})["ts"], seq) for seq, date in rows)
+        )
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # Products
+    @staticmethod
+    def _product_row(product_id, record):
+        data = as_dict(record)
+        return (product_id, data["name"], data["price"], data["quantity"],
+                data["category"], data["img"], data["description"])
+
+    @staticmethod
+    def _product_dict(row):
+        return dict(zip(PRODUCT_COLUMNS, row))
+
+    def products_signature(self):
+        # Bumped inside every products write, so it also sees other processes' commits
+        row = self._connection().execute(
+            "SELECT value FROM meta WHERE key = 'products_version'"
+        ).fetchone()
+        return (self.path, row[0])
+
+    def load_products(self):
+        rows = self._connection().execute(
+            "SELECT product_id, name, price, quantity, category, img, description FROM products ORDER BY rowid"
+        )
+        return {row[0]: self._product_dict(row) for row in rows}
+
+    def get_product(self, product_id):
+        row = self._connection().execute(
+            "SELECT product_id, name, price, quantity, category, img, description FROM products WHERE product_id = ?",
+            (product_id,)
+        ).fetchone()
+        return self._product_dict(row) if row else None
+
+    def save_products(self, products, changed=None, deleted=(), expected_signature=None):
+        conn = self._connection()
+        with conn:
+            # Take the write lock up front so the version check and the write are atomic
+            conn.execute("BEGIN IMMEDIATE")
+            if expected_signature is not None and self.products_signature() != expected_signature:
+                raise WriteConflict(self.path)
+            if changed is None:
+                conn.execute("DELETE FROM products")
+                conn.executemany(UPSERT_PRODUCT, (self._product_row(pid, p) for pid, p in products.items()))
+            else:
+                # Row-level write: only touch what changed
+                conn.executemany(UPSERT_PRODUCT, (self._product_row(pid, products[pid]) for pid in changed))
+                conn.executemany("DELETE FROM products WHERE product_id = ?", ((pid,) for pid in deleted))
+            conn.execute(BUMP_PRODUCTS_VERSION)
+            # Read inside the transaction: after commit another writer may already have moved it on
+            return self.products_signature()
+
+    def log_stock_changes(self, records, expected_signature=None):
+        # Quantities and transactions commit together, so a sale is never half recorded
+        conn = self._connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if expected_signature is not None and self.products_signature() != expected_signature:
+                raise WriteConflict(self.path)
+            conn.executemany(
+                "UPDATE products SET quantity = ? WHERE product_id = ?",
+                ((quantity, product_id) for record in records for product_id, quantity in record["quantities"].items())
+            )
+            conn.executemany(
+                INSERT_TRANSACTION,
+                (self._transaction_row(record["transaction"]) for record in records if record.get("transaction"))
+            )
+            conn.execute(BUMP_PRODUCTS_VERSION)
+            return self.products_signature(), None
+
+    # Transactions
+    @staticmethod
+    def _transaction_row(record):
+        data = with_timestamp(record)
+        return (data["transaction_id"], data["customer_name"], data["customer_phone"],
+                json.dumps(data["product_ids"]), json.dumps(data["quantities"]),
+                json.dumps(data["prices"]), data["date"], data["ts"])
+
+    @staticmethod
+    def _transaction_dict(row):
+        return {
+            "transaction_id": row[0],
+            "customer_name": row[1],
+            "customer_phone": row[2],
+            "product_ids": json.loads(row[3]),
+            "quantities": json.loads(row[4]),
+            "prices": json.loads(row[5]),
+            "date": row[6],
+            "ts": row[7]
+        }
+
+    def iter_transactions(self):
+        rows = self._connection().execute(f"SELECT {TRANSACTION_COLUMNS} FROM transactions ORDER BY seq")
+        for row in rows:
+            yield self._transaction_dict(row)
+
+    def iter_transactions_between(self, start_ts=None, end_ts=None):
+        # Range scan on idx_transactions_ts (one fixed statement per bound combination)
+        conditions, params = [], []
+        if start_ts is not None:
+            conditions.append("ts >= ?")
+            params.append(start_ts)
+        if end_ts is not None:
+            conditions.append("ts <= ?")
+            params.append(end_ts)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        rows = self._connection().execute(
+            f"SELECT {TRANSACTION_COLUMNS} FROM transactions {where}ORDER BY ts, seq", params
+        )
+        for row in rows:
+            yield self._transaction_dict(row)
+
+    def _transactions_epoch(self):
+        # Bumped by save_transactions, which renumbers the whole history
+        return self._connection().execute(
+            "SELECT value FROM meta WHERE key = 'transactions_epoch'"
+        ).fetchone()[0]
+
+    def transactions_position(self):
+        row = self._connection().execute("SELECT COALESCE(MAX(seq), 0) FROM transactions").fetchone()
+        return [self._transactions_epoch(), row[0]]
+
+    def iter_transactions_since(self, position):
+        epoch = self._transactions_epoch()
+        if position is None:
+            position = [epoch, 0]
+        elif position[0] != epoch:
+            raise StaleTransactionPosition(self.path)
+
+        rows = self._connection().execute(
+            f"SELECT {TRANSACTION_COLUMNS}, seq FROM transactions WHERE seq > ? ORDER BY seq",
+            (position[1],)
+        )
+        for row in rows:
+            yield self._transaction_dict(row), [epoch, row[8]]
+
+    def transactions_skew(self):
+        # Running maximum over the rows in seq order, extended with the rows added since the last call
+        epoch = self._transactions_epoch()
+        cached_epoch, seq, newest, skew = self._skew
+        if cached_epoch != epoch:
+            seq, newest, skew = 0, None, 0
+        rows = self._connection().execute("SELECT seq, ts FROM transactions WHERE seq > ? ORDER BY seq", (seq,))
+        for seq, ts in rows:
+            if newest is not None and ts < newest:
+                skew = max(skew, newest - ts)
+            newest = ts if newest is None else max(newest, ts)
+        self._skew = (epoch, seq, newest, skew)
+        return skew
+
+    def iter_transactions_reverse(self, before=None):
+        epoch = self._transactions_epoch()
+        if before is None:
+            rows = self._connection().execute(f"SELECT {TRANSACTION_COLUMNS}, seq FROM transactions ORDER BY seq DESC")
+        elif before[0] != epoch:
+            raise StaleTransactionPosition(self.path)
+        else:
+            rows = self._connection().execute(
+                f"SELECT {TRANSACTION_COLUMNS}, seq FROM transactions WHERE seq < ? ORDER BY seq DESC",
+                (before[1],)
+            )
+        for row in rows:
+            yield self._transaction_dict(row), [epoch, row[8]]
+
+    def append_transaction(self, record):
+        with self._connection() as conn:
+            conn.execute(INSERT_TRANSACTION, self._transaction_row(record))
+
+    def save_transactions(self, records):
+        rows = [self._transaction_row(r) for r in records]  # Materialise before deleting
+        with self._connection() as conn:
+            conn.execute("DELETE FROM transactions")
+            conn.executemany(INSERT_TRANSACTION, rows)
+            conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'transactions_epoch'")
+
+    # Users
+    def users_signature(self):
+        row = self._connection().execute("SELECT value FROM meta WHERE key = 'users_version'").fetchone()
+        return (self.path, row[0])
+
+    def load_users(self):
+        rows = self._connection().execute("SELECT username, password, role FROM users ORDER BY rowid")
+        return {row[0]: {"password": row[1], "role": row[2]} for row in rows}
+
+    def save_users(self, users):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM users")
+            conn.executemany(
+                "INSERT INTO users (username, password, role) VALUES (?, ?, ?)",
+                ((name, data["password"], data["role"]) for name, data in users.items())
+            )
+            conn.execute(BUMP_USERS_VERSION)
+
+    def put_users(self, users):
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO users (username, password, role) VALUES (?, ?, ?)",
+                ((name, data["password"], data["role"]) for name, data in users.items())
+            )
+            conn.execute(BUMP_USERS_VERSION)
+
+    # Documents
+    def load_document(self, name):
+        row = self._connection().execute("SELECT body FROM documents WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_document(self, name, data):
+        with self._connection() as conn:
+            conn.execute("INSERT OR REPLACE INTO documents (name, body) VALUES (?, ?)", (name, json.dumps(data)))
@@ -0,0 +1,161 @@
+import json
+import os
+import threading
+import diagnostics
+
+# Stock write-ahead log of the JSON backend (stock.wal in the data directory).
+# Sales and stock adjustments are appended here instead of rewriting
+# products.json, and concurrent writers share one fsync (group commit).
+# One JSON object per line:
+#   header  {"products": [inode, mtime_ns, size]}: the products.json the records apply to
+#   record  {"quantities": {product_id: quantity after the change}, "transaction": {...} or null}
+# Quantities are after-images, so replaying a record that is already in
+# products.json changes nothing. Rewriting products.json gives it a new inode,
+# which retires every record at once: a stale header means "ignore the records
+# (but still recover their transactions)".
+
+def _parse(lines):
+    """Yield the JSON objects in complete lines, skipping a line torn by a crash."""
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+class StockLog:
+    """
+    Append-only stock log with group commit.
+
+    append() writes records with one os.write (callers hold the data lock, so
+    processes never interleave) and returns a ticket; sync(ticket) returns once
+    the records are on disk. While one thread runs fsync, the threads that
+    append meanwhile queue behind it and are all covered by the next fsync.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._cond = threading.Condition()
+        self._written = 0       # Bytes appended by this process (tickets count in these)
+        self._synced = 0        # Bytes of those known to be on disk
+        self._syncing = False
+        self._cache = (None, 0, {})  # (header, bytes read, {product_id: quantity}) for quantities()
+
+    def _file(self):
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def size(self):
+        try:
+            return os.stat(self.path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def _header(self):
+        """Return the products identity in the header, or None if the log is empty or unreadable."""
+        try:
+            with open(self.path, "rb") as file:
+                line = file.readline()
+        except FileNotFoundError:
+            return None
+        for header in _parse([line]):
+            return header.get("products")
+        return None
+
+    def matches(self, identity):
+        """True if the logged records apply to the products.json with this identity."""
+        return identity is not None and self._header() == list(identity)
+
+    def append(self, identity, records):
+        """
+        Append records for the products.json with this identity; call with the data lock held.
+
+        A log written against another products.json is truncated first (its
+        records are already in the file that replaced it). Returns a ticket for sync().
+        """
+        fd = self._file()
+        size = os.fstat(fd).st_size
+        data = "".join(json.dumps(record) + "\n" for record in records).encode()
+        if not self.matches(identity):
+            if size:
+                os.ftruncate(fd, 0)
+            data = (json.dumps({"products": list(identity)}) + "\n").encode() + data
+        elif os.pread(fd, 1, size - 1) != b"\n":
+            data = b"\n" + data  # Terminate a record torn by an earlier crash
+        os.write(fd, data)
+        diagnostics.add("bytes_written", len(data))
+        with self._cond:
+            self._written += len(data)
+            return self._written
+
+    def sync(self, ticket):
+        """Block until everything up to ticket is on disk, sharing fsyncs between threads."""
+        with self._cond:
+            while self._synced < ticket:
+                if self._syncing:
+                    self._cond.wait()  # The running fsync may not cover us; check again after it
+                    continue
+                self._syncing = True
+                target = self._written
+                self._cond.release()
+                try:
+                    os.fsync(self._file())
+                finally:
+                    self._cond.acquire()
+                    self._syncing = False
+                    self._cond.notify_all()
+                self._synced = max(self._synced, target)
+
+    def read(self):
+        """Return (header identity, [records]) of every complete record in the log."""
+        try:
+            with open(self.path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None, []
+        diagnostics.add("bytes_read", len(data))
+        entries = list(_parse(data[:data.rfind(b"\n") + 1].split(b"\n")))
+        if not entries or "products" not in entries[0]:
+            return None, [entry for entry in entries if "quantities" in entry]
+        return entries[0]["products"], entries[1:]
+
+    def quantities(self, identity):
+        """
+        Return {product_id: logged quantity} for the products.json with this identity.
+
+        Reads only what was appended since the previous call; the returned dict
+        must not be modified.
+        """
+        header, offset, quantities = self._cache
+        size = self.size()
+        if size < offset or header != list(identity or ()):
+            header, offset, quantities = None, 0, {}  # Truncated or restarted since; read from the top
+        if size == offset:
+            return quantities if header is not None else {}
+
+        with open(self.path, "rb") as file:
+            file.seek(offset)
+            data = file.read(size - offset)
+        data = data[:data.rfind(b"\n") + 1]  # Leave a record still being written for next time
+        diagnostics.add("bytes_read", len(data))
+        quantities = dict(quantities)
+        for entry in _parse(data.split(b"\n")):
+            if "products" in entry:
+                header = entry["products"]
+            else:
+                quantities.update(entry.get("quantities", {}))
+        self._cache = (header, offset + len(data), quantities)
+        return quantities if header == list(identity or ()) else {}
+
+    def reset(self):
+        """
+        Empty the log; call with the data lock held, after products.json and
+        the journal hold everything it recorded (so pending syncs are satisfied too).
+        """
+        os.ftruncate(self._file(), 0)
+        with self._cond:
+            self._synced = self._written
+            self._cond.notify_all()
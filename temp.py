@@ -1,20 +1,6 @@
-import json
-import bcrypt
+from models.user import User
 
-users_file = "database/users.json"
+# Rehash plain text passwords (in parallel) and save the users once
+count = User.rehash_plaintext_passwords()
 
-# Load users
-with open(users_file, "r") as f:
-    users = json.load(f)
-
-# Rehash plain text passwords
-for username, details in users.items():
-    if not details["password"].startswith("$2b$"):  # If password is not hashed
-        hashed_password = bcrypt.hashpw(details["password"].encode(), bcrypt.gensalt()).decode()
-        users[username]["password"] = hashed_password
-
-# Save updated users.json
-with open(users_file, "w") as f:
-    json.dump(users, f, indent=4)
-
-print("✅ Passwords updated successfully.")
+print(f"✅ Passwords updated successfully. ({count} rehashed)")